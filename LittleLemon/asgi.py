@@ -2,6 +2,8 @@
 ASGI config for LittleLemon project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Served through it (e.g. ``uvicorn LittleLemon.asgi:application``), clients
+waiting on /api/orders/events do not hold a worker thread each.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
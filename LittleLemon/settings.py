@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,11 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'LittleLemonApi.routers.ReplicaRoutingMiddleware',
+    'LittleLemonApi.metrics.MetricsMiddleware',
+    'LittleLemonApi.compression.CompressionMiddleware',
+    'LittleLemonApi.instrumentation.QueryInstrumentationMiddleware',
+    'LittleLemonApi.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,11 +85,73 @@ WSGI_APPLICATION = 'LittleLemon.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # django.db.backends.sqlite3 with Django 5.1's init_command and transaction_mode OPTIONS
+        'ENGINE': 'LittleLemonApi.db',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # a file rather than the in-memory default, so concurrent tests queue on SQLite's
+        # write lock as in production instead of failing at once on shared-cache table locks
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Production SQLite profile, enabled with LITTLELEMON_DB_PROFILE=production
+SQLITE_PRODUCTION_PROFILE = {
+    # keep connections (and their pragmas and page cache) across requests
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        # writers queue on the write lock at BEGIN instead of deadlocking on a lock upgrade
+        'transaction_mode': 'IMMEDIATE',
+        # seconds to wait for the write lock before "database is locked"
+        'timeout': 20,
+        'init_command': ';'.join([
+            # readers no longer block the writer or each other
+            'PRAGMA journal_mode=WAL',
+            # fsync at checkpoints only; a power loss can drop the last commits, never corrupt
+            'PRAGMA synchronous=NORMAL',
+            # 64 MiB page cache and 256 MiB memory map per connection
+            'PRAGMA cache_size=-65536',
+            'PRAGMA mmap_size=268435456',
+            'PRAGMA temp_store=MEMORY',
+        ]),
+    },
+}
+
+if os.environ.get('LITTLELEMON_DB_PROFILE') == 'production':
+    DATABASES['default'].update(SQLITE_PRODUCTION_PROFILE)
+
+# Read replicas (see LittleLemonApi/routers.py): LITTLELEMON_REPLICAS lists SQLite files, comma separated,
+# kept up to date with the primary by the sync_replica command
+DATABASE_REPLICAS = []
+for path in filter(None, os.environ.get('LITTLELEMON_REPLICAS', '').split(',')):
+    DATABASE_REPLICAS.append(f'replica{len(DATABASE_REPLICAS) + 1}')
+    # tests read the test primary through the replica aliases
+    DATABASES[DATABASE_REPLICAS[-1]] = {**DATABASES['default'], 'NAME': path, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['LittleLemonApi.routers.PrimaryReplicaRouter']
+
+# seconds a replica may lag behind the primary; data changed more recently is read from the primary
+REPLICA_MAX_LAG = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# 'shared' lives on disk so that every worker process on the host sees the same
+# entries (version markers are in the shared store); 'default' stays per process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -131,16 +199,103 @@ DJOSER = {
 }
 
 REST_FRAMEWORK = {
+    # the browsable API is a development aid; production only renders JSON
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
-    ],
+        'LittleLemonApi.renderers.FastJSONRenderer',
+    ] + (['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
     'DEFAULT_AUTHENTICATION_CLASSES': [
         # 'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'LittleLemonApi.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '2/minute',
         'user': '5/minute',
+        'menu': '20/minute',
+        'checkout': '3/minute',
+        'batch': '10/minute',
+        'order_events': '30/minute',
     }
-}
\ No newline at end of file
+}
+
+
+# SQLite file shared by all worker processes for version markers, throttle counters and metrics
+# (see LittleLemonApi/sharedstore.py)
+SHARED_STORE_PATH = BASE_DIR / 'shared.sqlite3'
+
+# Per-request SQL instrumentation, Server-Timing header and slow request log
+# (see LittleLemonApi/instrumentation.py); off unless enabled here
+SQL_INSTRUMENTATION = False
+SLOW_REQUEST_THRESHOLD_MS = 500
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'slow_requests.log',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'LittleLemonApi.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Role resolution cache (see LittleLemonApi/roles.py)
+ROLE_CACHE_SIZE = 1024
+ROLE_CACHE_TTL = 60
+
+# Token -> user cache of CachedTokenAuthentication (see LittleLemonApi/authentication.py)
+TOKEN_CACHE_SIZE = 4096
+TOKEN_CACHE_TTL = 300
+
+# Seconds the /api/menu-items?with_count=1 total is served from the cache
+MENU_ITEM_COUNT_CACHE_TIMEOUT = 60
+
+# Seconds a cached menu payload may be served; writes invalidate it sooner
+CATALOG_CACHE_TIMEOUT = 300
+
+# Metrics recorded by each worker are added to the shared store at most this
+# many seconds apart; /metrics requires this bearer token when it is set
+METRICS_FLUSH_INTERVAL = 10
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Opt-in cProfile sampling of requests (see LittleLemonApi/profiling.py):
+# a fraction of all requests plus staff requests sending PROFILE_HEADER;
+# summarize with `manage.py profile_summary`
+PROFILING = False
+PROFILE_SAMPLE_RATE = 0.01
+PROFILE_HEADER = 'X-Profile'
+PROFILE_DIR = BASE_DIR / 'profiles'
+
+# Responses smaller than this many bytes are sent uncompressed
+# (see LittleLemonApi/compression.py); Brotli is used when installed
+COMPRESSION_MIN_SIZE = 1024
+BROTLI_QUALITY = 5
+
+# Idempotency-Key support (see LittleLemonApi/idempotency.py): seconds a stored
+# response is replayed, seconds after which an unfinished request's key may be
+# reused, and seconds between background purges of expired keys
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = 60
+IDEMPOTENCY_PURGE_INTERVAL = 10 * 60
+
+# POST /api/batch (see LittleLemonApi/batch.py): sub-requests per batch and
+# threads running independent GETs of a batch at the same time
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_CONCURRENCY = 4
+
+# GET /api/orders/events (see LittleLemonApi/feed.py): longest ?wait= of a long
+# poll, seconds between checks for new events, idle seconds before an event
+# stream sends a keepalive comment, seconds before a stream ends (clients
+# reconnect with Last-Event-ID) and events returned at a time
+ORDER_FEED_MAX_WAIT = 30
+ORDER_FEED_POLL_INTERVAL = 0.5
+ORDER_FEED_KEEPALIVE = 15
+ORDER_FEED_STREAM_TIMEOUT = 5 * 60
+ORDER_FEED_PAGE_SIZE = 100
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LittlelemonapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LittleLemonApi'
+
+    def ready(self):
+        # connect the signal receivers that keep the credential, role and catalog caches in sync
+        from . import authentication, catalog, roles  # noqa: F401
@@ -0,0 +1,65 @@
+import copy
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .instrumentation import segment
+from .lru import LRUCache
+from .roles import load_roles, prime_roles
+from .versions import auth_scope, bump_version, get_version
+
+# token key -> (user, token, roles, auth version)
+_credentials = LRUCache(maxsize=getattr(settings, 'TOKEN_CACHE_SIZE', 4096),
+                        ttl=getattr(settings, 'TOKEN_CACHE_TTL', 300))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps token -> user (and the user's roles) in a
+    bounded per-process cache instead of querying them on every request.
+    Entries are checked against the user's auth version in the shared cache, so
+    logging out, deleting a token, changing or deactivating the user or
+    changing their groups takes effect in every worker process immediately.
+    """
+
+    def authenticate(self, request):
+        self.roles = None
+        with segment('auth'):
+            result = super().authenticate(request)
+        if result is not None and self.roles is not None:
+            prime_roles(request, self.roles)
+        return result
+
+    def authenticate_credentials(self, key):
+        entry = _credentials.get(key)
+        if entry is not None:
+            user, token, roles, version = entry
+            if get_version(auth_scope(user.pk)) == version:
+                self.roles = roles
+                # callers get their own copy; the cached one is shared between threads
+                return copy.copy(user), token
+            _credentials.pop(key)
+
+        user, token = super().authenticate_credentials(key)
+        # read the version before the roles, so a change in between is caught next time
+        version = get_version(auth_scope(user.pk))
+        self.roles = load_roles(user, version)
+        _credentials.set(key, (copy.copy(user), token, self.roles, version))
+        return user, token
+
+
+@receiver(post_delete, sender=Token)
+def _token_deleted(sender, instance, **kwargs):
+    _credentials.pop(instance.key)
+    bump_version(auth_scope(instance.user_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _user_changed(sender, instance, **kwargs):
+    # covers deactivation as well as any other change to the cached user object
+    bump_version(auth_scope(instance.pk))
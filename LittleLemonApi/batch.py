@@ -0,0 +1,135 @@
+import contextvars
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection, connections
+from django.http import Http404
+from django.urls import Resolver404, resolve
+from rest_framework.response import Response
+
+from .roles import get_roles
+
+logger = logging.getLogger('django.request')
+
+BATCH_PREFIX = '/api/'
+SAFE_METHODS = ('GET', 'HEAD')
+# headers of a sub-response that are passed back to the client
+RESPONSE_HEADERS = ('ETag', 'Last-Modified', 'Retry-After', 'Idempotent-Replayed', 'Location')
+# outer request headers that sub-requests inherit; everything else comes from the sub-request itself
+INHERITED_HEADERS = ('HTTP_HOST', 'HTTP_X_FORWARDED_FOR', 'HTTP_AUTHORIZATION', 'HTTP_ACCEPT_LANGUAGE')
+
+
+def _sub_request(request, item):
+    path, _, query = item['path'].partition('?')
+    body = json.dumps(item['body']).encode() if item.get('body') is not None else b''
+    environ = {key: value for key, value in request.META.items()
+               if not key.startswith(('HTTP_', 'CONTENT_', 'wsgi.input')) or key in INHERITED_HEADERS}
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': BytesIO(body),
+    })
+    for name, value in (item.get('headers') or {}).items():
+        if name.lower() != 'authorization':
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+    sub = WSGIRequest(environ)
+
+    # the batch request already authenticated the user and resolved their roles
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    sub._roles = get_roles(request)
+    return sub
+
+
+def _body(response):
+    if isinstance(response, Response):
+        return response.data
+    if getattr(response, 'streaming', False):
+        response.close()
+        return {'message': 'Streaming responses cannot be batched'}
+    if not response.content:
+        return None
+    try:
+        return json.loads(response.content)
+    except ValueError:
+        return response.content.decode(response.charset, errors='replace')
+
+
+def run_one(request, item):
+    """Runs one sub-request through the URL resolver and its view; returns its result."""
+    path = item['path'].partition('?')[0]
+    try:
+        if not path.startswith(BATCH_PREFIX):
+            raise Resolver404
+        match = resolve(path)
+    except Resolver404:
+        return {'status': 404, 'headers': {}, 'body': {'message': 'Not found'}}
+    if match.url_name == 'batch':
+        return {'status': 400, 'headers': {}, 'body': {'message': 'Batches cannot be nested'}}
+
+    sub = _sub_request(request, item)
+    sub.resolver_match = match
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+    except Http404:
+        return {'status': 404, 'headers': {}, 'body': {'message': 'Not found'}}
+    except Exception:
+        logger.exception('Internal Server Error in batched %s %s', item['method'], item['path'])
+        return {'status': 500, 'headers': {}, 'body': {'message': 'Internal Server Error'}}
+    if response.status_code == 404 and not isinstance(response, Response):
+        return {'status': 404, 'headers': {}, 'body': {'message': 'Not found'}}
+    return {
+        'status': response.status_code,
+        'headers': {name: response[name] for name in RESPONSE_HEADERS if response.has_header(name)},
+        'body': _body(response),
+    }
+
+
+def _run_in_thread(request, item):
+    try:
+        return run_one(request, item)
+    finally:
+        # worker threads get their own connections; don't leak them
+        connections.close_all()
+
+
+def run_batch(request, items):
+    """
+    Runs ``items`` (dicts with method, path and optional body and headers)
+    in order and returns one result per item. Consecutive GET/HEAD
+    sub-requests don't depend on each other and run concurrently, unless the
+    batch runs inside a transaction other threads could not see; writes run
+    one at a time, after everything before them.
+    """
+    results = [None] * len(items)
+    concurrent = not connection.in_atomic_block and settings.BATCH_MAX_CONCURRENCY > 1
+    with ThreadPoolExecutor(max_workers=settings.BATCH_MAX_CONCURRENCY) if concurrent else nullcontext() as pool:
+        i = 0
+        while i < len(items):
+            if not concurrent or items[i]['method'] not in SAFE_METHODS:
+                results[i] = run_one(request, items[i])
+                i += 1
+                continue
+            group = [i]
+            while group[-1] + 1 < len(items) and items[group[-1] + 1]['method'] in SAFE_METHODS:
+                group.append(group[-1] + 1)
+            if len(group) == 1:
+                results[i] = run_one(request, items[i])
+            else:
+                # each thread runs in a copy of this context, so e.g. routers.use_primary() carries over
+                contexts = [contextvars.copy_context() for _ in group]
+                for index, result in zip(group, pool.map(
+                        lambda j, context: context.run(_run_in_thread, request, items[j]), group, contexts)):
+                    results[index] = result
+            i = group[-1] + 1
+    return results
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from collections import Counter
+
+from django.db import close_old_connections, connection
+from django.test import Client
+
+from .routes import percentile
+
+# the database settings without the production profile
+DEFAULT_PROFILE = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}
+
+
+def _pick(items, i):
+    return items[i % len(items)]
+
+
+def _checkout(data, customer, i):
+    # fill the cart, then check it out
+    items = [{'menuitem': _pick(data.menu_items, i * 3 + offset).pk, 'quantity': 1} for offset in range(3)]
+    return [('POST', '/api/cart/menu-items/bulk', {'items': items}, (200,)),
+            ('POST', '/api/orders', None, (201,))]
+
+
+def _cart_update(data, customer, i):
+    items = [{'menuitem': _pick(data.menu_items, i + offset).pk, 'quantity': i % 4 + 1} for offset in range(5)]
+    return [('POST', '/api/cart/menu-items/bulk', {'items': items}, (200,))]
+
+
+def _browse(data, customer, i):
+    # menu pages and dishes come from the catalog cache once warm; order history always reads the database
+    return [('GET', f'/api/menu-items?ordering=price&perpage=20&page={i % 5 + 1}', None, (200,)),
+            ('GET', f'/api/menu-items/{_pick(data.menu_items, i).pk}', None, (200,)),
+            ('GET', '/api/orders?perpage=10', None, (200,))]
+
+
+WORKLOADS = {'checkout': _checkout, 'cart': _cart_update, 'browse': _browse}
+
+
+def run(data, duration, writers, readers):
+    """
+    Runs ``writers`` checkout and ``writers`` cart update threads next to
+    ``readers`` menu browsing threads for ``duration`` seconds, each thread
+    as its own customer with its own connection. Connections are closed (or
+    kept, with CONN_MAX_AGE) after every request the way Django's request
+    handler does. Returns throughput, latency and unexpected statuses per
+    workload.
+    """
+    lock = threading.Lock()
+    latencies = {name: [] for name in WORKLOADS}
+    statuses = {name: Counter() for name in WORKLOADS}
+    errors = Counter()
+    kinds = ['checkout'] * writers + ['cart'] * writers + ['browse'] * readers
+    if len(kinds) > len(data.customers):
+        raise ValueError(f'{len(kinds)} threads need as many customers; seed at least that many.')
+    barrier = threading.Barrier(len(kinds) + 1)
+
+    def worker(kind, customer):
+        client = Client(HTTP_AUTHORIZATION=f'Token {data.token(customer)}')
+        workload = WORKLOADS[kind]
+        i = 0
+        try:
+            barrier.wait()
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                for method, path, body, expect in workload(data, customer, i):
+                    start = time.perf_counter()
+                    response = client.generic(method, path, json.dumps(body) if body is not None else '',
+                                              content_type='application/json')
+                    elapsed = time.perf_counter() - start
+                    close_old_connections()
+                    with lock:
+                        latencies[kind].append(elapsed)
+                        statuses[kind][response.status_code] += 1
+                        if response.status_code not in expect:
+                            errors[kind] += 1
+                i += 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(kind, customer))
+               for kind, customer in zip(kinds, data.customers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    results = {}
+    for name in WORKLOADS:
+        values = sorted(latencies[name])
+        results[name] = {
+            'requests': len(values),
+            'throughput_rps': round(len(values) / wall, 1) if wall else 0.0,
+            'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+            'statuses': {str(code): count for code, count in sorted(statuses[name].items())},
+            'errors': errors[name],
+        }
+    return results
@@ -0,0 +1,48 @@
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def benchmark_database(profile=None):
+    """
+    Runs the body against a freshly migrated, throwaway SQLite file (never the
+    configured database), with throttling off and the shared cache and store
+    moved into the same temporary directory. ``profile`` (e.g.
+    settings.SQLITE_PRODUCTION_PROFILE) replaces the database's connection
+    settings for the duration.
+    """
+    database = connection.settings_dict
+    saved = {key: database[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')}
+    if profile is not None:
+        connection.close()
+        database.update(profile)
+    with tempfile.TemporaryDirectory(prefix='littlelemon-bench-') as directory:
+        rest_framework = dict(settings.REST_FRAMEWORK)
+        rest_framework['DEFAULT_THROTTLE_RATES'] = {scope: None for scope in rest_framework['DEFAULT_THROTTLE_RATES']}
+        caches = {alias: dict(config) for alias, config in settings.CACHES.items()}
+        caches['shared']['LOCATION'] = os.path.join(directory, 'cache')
+
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        # expected 4xx responses (e.g. checkout conflicts) are counted, not logged
+        request_logger = logging.getLogger('django.request')
+        log_level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        setup_test_environment()
+        try:
+            with override_settings(REST_FRAMEWORK=rest_framework, CACHES=caches,
+                                   SHARED_STORE_PATH=os.path.join(directory, 'shared.sqlite3')):
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                try:
+                    yield directory
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            teardown_test_environment()
+            request_logger.setLevel(log_level)
+            database.update(saved)
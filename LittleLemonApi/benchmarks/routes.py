@@ -0,0 +1,275 @@
+import json
+import threading
+import time
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection
+from django.test import Client
+
+from ..feed import record_event
+from ..models import Cart, MenuItem, Order, OrderEvent
+from .seed import PASSWORD
+
+
+class Route:
+    """
+    One benchmarked API route. ``prepare(data, i)`` runs untimed before the
+    i-th request and returns ``(path, body)``, so write routes can set up
+    whatever their request consumes (a filled cart, an order to delete...).
+    """
+
+    def __init__(self, name, method, role, prepare, expect=(200,)):
+        self.name = name
+        self.method = method
+        self.role = role
+        self.prepare = prepare
+        self.expect = expect
+
+
+def _pick(items, i):
+    return items[i % len(items)]
+
+
+def _new_menu_item(data, i):
+    return MenuItem.objects.create(title=f'Benchmark dish {i}', price=Decimal('9.99'), featured=False,
+                                   category=_pick(data.categories, i))
+
+
+def _fill_cart(data, i):
+    customer = _pick(data.customers, i)
+    Cart.objects.filter(user=customer).delete()
+    items = [_pick(data.menu_items, i + offset) for offset in range(3)]
+    Cart.objects.bulk_create([Cart(user=customer, menuitem=item, quantity=1, unit_price=item.price,
+                                   price=item.price) for item in items])
+    return '/api/orders', None
+
+
+def _add_to_cart(data, i):
+    customer, item = _pick(data.customers, i), _pick(data.menu_items, i)
+    Cart.objects.filter(user=customer, menuitem=item).delete()
+    return '/api/cart/menu-items', {'menuitem': item.pk, 'quantity': 1, 'unit_price': str(item.price),
+                                    'price': str(item.price)}
+
+
+def _bulk_cart(data, i):
+    return '/api/cart/menu-items/bulk', {'items': [{'menuitem': _pick(data.menu_items, i + offset).pk, 'quantity': 2}
+                                                   for offset in range(20)]}
+
+
+def _customer_order(data, i):
+    # customers that have order history, so the detail route returns an order of their own
+    customer_ids = sorted(data.orders)
+    customer_id = _pick(customer_ids, i)
+    return customer_id, _pick(data.orders[customer_id], i)
+
+
+def _batch(data, i):
+    return '/api/batch', {'requests': [
+        {'method': 'POST', 'path': '/api/cart/menu-items/bulk',
+         'body': {'items': [{'menuitem': _pick(data.menu_items, i + offset).pk, 'quantity': 1} for offset in range(3)]}},
+        {'method': 'GET', 'path': '/api/cart/menu-items'},
+        {'method': 'GET', 'path': '/api/orders'},
+        {'method': 'GET', 'path': f'/api/menu-items?ordering=price&perpage=20&page={i % 5 + 1}'},
+    ]}
+
+
+def _crew_order(data, i):
+    # an order assigned to the i-th delivery crew member, as the crew routes act for them
+    order_id = _pick(_pick(list(data.orders.values()), i), i)
+    Order.objects.filter(pk=order_id).update(delivery_crew=_pick(data.delivery_crew, i))
+    return Order.objects.get(pk=order_id)
+
+
+def _order_event(data, i):
+    # a change is waiting, so the long poll answers at once instead of timing the wait
+    event = record_event(_crew_order(data, i), OrderEvent.STATUS)
+    return f'/api/orders/events?cursor={event.pk - 1}&wait=5', None
+
+
+def _new_order(data, i):
+    return Order.objects.create(user=_pick(data.customers, i), total=Decimal('9.99'), date=date.today())
+
+
+ROUTES = [
+    Route('GET /api/', 'GET', 'customer', lambda data, i: ('/api/', None)),
+    Route('GET /api/menu-items', 'GET', 'customer',
+          lambda data, i: (f'/api/menu-items?ordering=price&perpage=20&page={i % 5 + 1}', None)),
+    Route('GET /api/menu-items (cursor)', 'GET', 'customer',
+          lambda data, i: ('/api/menu-items?pagination=cursor&ordering=-price&perpage=20', None)),
+    Route('POST /api/menu-items', 'POST', 'manager',
+          lambda data, i: ('/api/menu-items', {'title': f'New dish {i}', 'price': '12.50', 'featured': False,
+                                               'category': _pick(data.categories, i).pk}), expect=(201,)),
+    Route('GET /api/menu-items/<id>', 'GET', 'customer',
+          lambda data, i: (f'/api/menu-items/{_pick(data.menu_items, i).pk}', None)),
+    Route('PATCH /api/menu-items/<id>', 'PATCH', 'manager',
+          lambda data, i: (f'/api/menu-items/{_pick(data.menu_items, i).pk}', {'price': f'{10 + i % 50}.00'})),
+    Route('DELETE /api/menu-items/<id>', 'DELETE', 'manager',
+          lambda data, i: (f'/api/menu-items/{_new_menu_item(data, i).pk}', None), expect=(204,)),
+    Route('GET /api/menu-items/cache-stats', 'GET', 'manager', lambda data, i: ('/api/menu-items/cache-stats', None)),
+    Route('POST /api/api-token-auth/', 'POST', 'anonymous',
+          lambda data, i: ('/api/api-token-auth/', {'username': _pick(data.customers, i).username,
+                                                     'password': PASSWORD})),
+    Route('GET /api/groups/manager/users', 'GET', 'manager', lambda data, i: ('/api/groups/manager/users', None)),
+    Route('POST /api/groups/manager/users', 'POST', 'manager',
+          lambda data, i: ('/api/groups/manager/users', {'username': _pick(data.managers, i).username}),
+          expect=(201,)),
+    Route('DELETE /api/groups/manager/users/<username>', 'DELETE', 'manager',
+          lambda data, i: (f'/api/groups/manager/users/{_pick(data.customers, i).username}', None)),
+    Route('GET /api/groups/delivery-crew/users', 'GET', 'manager',
+          lambda data, i: ('/api/groups/delivery-crew/users', None)),
+    Route('POST /api/groups/delivery-crew/users', 'POST', 'manager',
+          lambda data, i: ('/api/groups/delivery-crew/users', {'username': _pick(data.delivery_crew, i).username}),
+          expect=(201,)),
+    Route('DELETE /api/groups/delivery-crew/users/<username>', 'DELETE', 'manager',
+          lambda data, i: (f'/api/groups/delivery-crew/users/{_pick(data.customers, i).username}', None)),
+    Route('GET /api/cart/menu-items', 'GET', 'customer', lambda data, i: ('/api/cart/menu-items', None)),
+    Route('POST /api/cart/menu-items', 'POST', 'customer', _add_to_cart, expect=(201,)),
+    Route('DELETE /api/cart/menu-items', 'DELETE', 'customer', lambda data, i: ('/api/cart/menu-items', None)),
+    Route('POST /api/cart/menu-items/bulk', 'POST', 'customer', _bulk_cart),
+    Route('GET /api/orders (customer)', 'GET', 'customer', lambda data, i: ('/api/orders', None)),
+    Route('GET /api/orders (manager)', 'GET', 'manager', lambda data, i: ('/api/orders?status=false', None)),
+    Route('GET /api/orders (delivery crew)', 'GET', 'crew', lambda data, i: ('/api/orders', None)),
+    Route('POST /api/orders', 'POST', 'customer', _fill_cart, expect=(201,)),
+    Route('GET /api/orders/export', 'GET', 'manager',
+          lambda data, i: ('/api/orders/export?date_from=2024-06-01&date_to=2024-06-30', None)),
+    Route('GET /api/orders/<id>', 'GET', 'customer', lambda data, i: (f'/api/orders/{_customer_order(data, i)[1]}', None)),
+    Route('PATCH /api/orders/<id> (assign crew)', 'PATCH', 'manager', lambda data, i: (
+        f'/api/orders/{_pick(_pick(list(data.orders.values()), i), i)}',
+        {'delivery_crew': _pick(data.delivery_crew, i).pk},
+    )),
+    Route('PATCH /api/orders/<id> (crew status)', 'PATCH', 'crew',
+          lambda data, i: (f'/api/orders/{_crew_order(data, i).pk}', {'status': i % 2})),
+    Route('GET /api/orders/events (long poll)', 'GET', 'crew', _order_event),
+    Route('DELETE /api/orders/<id>', 'DELETE', 'manager',
+          lambda data, i: (f'/api/orders/{_new_order(data, i).pk}', None)),
+    Route('POST /api/batch', 'POST', 'customer', _batch),
+    Route('GET /api/analytics/revenue', 'GET', 'manager',
+          lambda data, i: ('/api/analytics/revenue?date_from=2024-01-01&date_to=2024-12-31', None)),
+    Route('GET /api/analytics/menu-items', 'GET', 'manager', lambda data, i: ('/api/analytics/menu-items', None)),
+    Route('GET /api/analytics/categories', 'GET', 'manager', lambda data, i: ('/api/analytics/categories', None)),
+]
+
+
+def _user_for(route, data, i):
+    if route.role == 'anonymous':
+        return None
+    if route.role == 'customer':
+        if route.name == 'GET /api/orders/<id>':
+            customer_id = _customer_order(data, i)[0]
+            return next(user for user in data.customers if user.pk == customer_id)
+        return _pick(data.customers, i)
+    return _pick({'manager': data.managers, 'crew': data.delivery_crew}[route.role], i)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_route(route, data, requests, concurrency):
+    """
+    Sends ``requests`` requests to ``route`` from ``concurrency`` threads, each
+    with its own in-process test client and database connection. An exception
+    raised while preparing or sending a request counts as an error, and the
+    thread carries on with the next request.
+    """
+    lock = threading.Lock()
+    next_index = iter(range(requests))
+    latencies, queries, statuses, exceptions = [], [], Counter(), Counter()
+
+    def worker():
+        client = Client()
+        counter = _QueryCounter()
+        try:
+            with connection.execute_wrapper(counter):
+                while True:
+                    with lock:
+                        i = next(next_index, None)
+                    if i is None:
+                        return
+                    try:
+                        path, body = route.prepare(data, i)
+                        user = _user_for(route, data, i)
+                        headers = {'HTTP_AUTHORIZATION': f'Token {data.token(user)}'} if user else {}
+                        body = json.dumps(body) if body is not None else ''
+
+                        before = counter.count
+                        start = time.perf_counter()
+                        response = client.generic(route.method, path, body, content_type='application/json',
+                                                  **headers)
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                        elapsed = time.perf_counter() - start
+                    except Exception as error:
+                        with lock:
+                            exceptions[f'{type(error).__name__}: {error}'] += 1
+                        continue
+                    with lock:
+                        latencies.append(elapsed)
+                        queries.append(counter.count - before)
+                        statuses[response.status_code] += 1
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    queries.sort()
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        # the median is not skewed by the cold-cache first requests
+        'queries': percentile(queries, 0.50),
+        'queries_max': queries[-1] if queries else 0,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'errors': sum(count for code, count in statuses.items() if code not in route.expect)
+        + sum(exceptions.values()),
+        'exceptions': dict(exceptions.most_common()),
+    }
+
+
+def run(data, requests, concurrency, only=None):
+    results = {}
+    for route in ROUTES:
+        if only and not any(pattern in route.name for pattern in only):
+            continue
+        results[route.name] = run_route(route, data, requests, concurrency)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns human readable regressions of ``results`` against a saved baseline."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {previous["p95_ms"]}ms -> {current["p95_ms"]}ms')
+        if current['throughput_rps'] < previous['throughput_rps'] / (1 + tolerance):
+            regressions.append(f'{name}: throughput {previous["throughput_rps"]} -> {current["throughput_rps"]} rps')
+        if current['queries'] > previous['queries']:
+            regressions.append(f'{name}: queries per request {previous["queries"]} -> {current["queries"]}')
+    return regressions
@@ -0,0 +1,47 @@
+import statistics
+import time
+
+from ..fastserializers import FastListSerializer
+from ..models import MenuItem
+from ..search import full_text, like_scan
+from ..serializers import MenuItemSerializer
+
+QUERIES = ['falafel', 'spic fal', 'lemon dess', 'category 3', 'hummus 99', 'nothing']
+PAGE_SIZE = 20
+
+
+def _page(search, text):
+    # what GET /api/menu-items?search=...&perpage=20&with_count=1 runs: one page by relevance and the total
+    queryset = search(MenuItem.objects.all(), text)
+    rows = FastListSerializer(MenuItemSerializer).list(queryset.order_by('search_rank', 'id')[:PAGE_SIZE])
+    return queryset.count(), rows
+
+
+def _time(search, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count, rows = _page(search, text)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), count
+
+
+def run(repeat, only=None):
+    """
+    Times a page of search results plus their count through the FTS5 index
+    and through LIKE scans of the menu item and category titles.
+    """
+    results = {}
+    for text in QUERIES:
+        if only and not any(pattern in text for pattern in only):
+            continue
+        like_seconds, like_count = _time(like_scan, text, repeat)
+        fts_seconds, fts_count = _time(full_text, text, repeat)
+        results[text] = {
+            'like_ms': round(like_seconds * 1000, 3),
+            'fts_ms': round(fts_seconds * 1000, 3),
+            'speedup': round(like_seconds / fts_seconds, 1) if fts_seconds else None,
+            'like_matches': like_count,
+            'fts_matches': fts_count,
+        }
+    return results
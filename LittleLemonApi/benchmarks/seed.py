@@ -0,0 +1,130 @@
+import hashlib
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from rest_framework.authtoken.models import Token
+
+from ..models import Cart, Category, MenuItem, Order, OrderItem
+from ..roles import DELIVERY_CREW, MANAGER
+from ..sales import rebuild as rebuild_sales_rollups
+
+PASSWORD = 'littlelemon'
+FIRST_ORDER_DATE = date(2024, 1, 1)
+DISHES = ['Greek Salad', 'Bruschetta', 'Lemon Dessert', 'Grilled Fish', 'Pasta', 'Chicken Souvlaki',
+          'Falafel', 'Moussaka', 'Baklava', 'Hummus', 'Lamb Kofta', 'Spanakopita']
+STYLES = ['Classic', 'Spicy', 'Vegan', 'Family', 'Chef\'s', 'Mini', 'Crispy', 'Smoky']
+
+DEFAULTS = {
+    'categories': 5,
+    'menu_items': 200,
+    'managers': 2,
+    'delivery_crew': 5,
+    'customers': 50,
+    'carts': 20,
+    'cart_size': 3,
+    'orders': 500,
+    'items_per_order': 3,
+    'seed': 42,
+}
+
+
+class SeedData:
+    """What seed() created, for building requests against it."""
+
+    def __init__(self):
+        self.managers = []
+        self.delivery_crew = []
+        self.customers = []
+        self.tokens = {}
+        self.categories = []
+        self.menu_items = []
+        self.orders = {}
+
+    def token(self, user):
+        return self.tokens[user.pk]
+
+
+def _token_key(seed, username):
+    return hashlib.sha1(f'{seed}:{username}'.encode()).hexdigest()
+
+
+def seed(categories=5, menu_items=200, managers=2, delivery_crew=5, customers=50, carts=20, cart_size=3,
+         orders=500, items_per_order=3, seed=42, batch_size=1000):
+    """
+    Fills the database with a deterministic data set: the same arguments always
+    produce the same rows. Every user's password is PASSWORD and every user gets
+    a token.
+    """
+    rng = random.Random(seed)
+    data = SeedData()
+    manager_group, _ = Group.objects.get_or_create(name=MANAGER)
+    crew_group, _ = Group.objects.get_or_create(name=DELIVERY_CREW)
+
+    # users, roles and tokens:
+    password = make_password(PASSWORD)
+    for role, count, bucket in (('manager', managers, data.managers),
+                                ('crew', delivery_crew, data.delivery_crew),
+                                ('customer', customers, data.customers)):
+        bucket.extend(User.objects.bulk_create([
+            User(username=f'{role}-{i}', email=f'{role}-{i}@littlelemon.test', password=password)
+            for i in range(count)
+        ], batch_size=batch_size))
+    memberships = [User.groups.through(user_id=user.pk, group_id=manager_group.pk) for user in data.managers]
+    memberships += [User.groups.through(user_id=user.pk, group_id=crew_group.pk) for user in data.delivery_crew]
+    User.groups.through.objects.bulk_create(memberships, batch_size=batch_size)
+    users = data.managers + data.delivery_crew + data.customers
+    Token.objects.bulk_create([Token(key=_token_key(seed, user.username), user=user) for user in users],
+                              batch_size=batch_size)
+    data.tokens = {user.pk: _token_key(seed, user.username) for user in users}
+
+    # catalog:
+    data.categories = Category.objects.bulk_create([
+        Category(slug=f'category-{i}', title=f'Category {i}') for i in range(categories)
+    ])
+    data.menu_items = MenuItem.objects.bulk_create([
+        MenuItem(title=f'{rng.choice(STYLES)} {rng.choice(DISHES)} {i}',
+                 price=Decimal(rng.randint(300, 3000)) / 100,
+                 featured=rng.random() < 0.1,
+                 category=rng.choice(data.categories))
+        for i in range(menu_items)
+    ], batch_size=batch_size)
+
+    # carts:
+    cart_rows = []
+    for customer in data.customers[:carts]:
+        for menuitem in rng.sample(data.menu_items, min(cart_size, len(data.menu_items))):
+            quantity = rng.randint(1, 3)
+            cart_rows.append(Cart(user=customer, menuitem=menuitem, quantity=quantity,
+                                  unit_price=menuitem.price, price=menuitem.price * quantity))
+    Cart.objects.bulk_create(cart_rows, batch_size=batch_size)
+
+    # order history, a batch at a time:
+    for start in range(0, orders, batch_size):
+        batch, lines = [], []
+        for _ in range(start, min(start + batch_size, orders)):
+            customer = rng.choice(data.customers)
+            picked = rng.sample(data.menu_items, min(items_per_order, len(data.menu_items)))
+            quantities = [rng.randint(1, 3) for _ in picked]
+            batch.append(Order(
+                user=customer,
+                delivery_crew=rng.choice(data.delivery_crew) if data.delivery_crew and rng.random() < 0.7 else None,
+                status=rng.random() < 0.5,
+                total=sum(item.price * quantity for item, quantity in zip(picked, quantities)),
+                date=FIRST_ORDER_DATE + timedelta(days=rng.randint(0, 364)),
+            ))
+            lines.append(list(zip(picked, quantities)))
+        Order.objects.bulk_create(batch)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=item, quantity=quantity, unit_price=item.price,
+                      price=item.price * quantity)
+            for order, order_lines in zip(batch, lines) for item, quantity in order_lines
+        ], batch_size=batch_size)
+        for order in batch:
+            data.orders.setdefault(order.user_id, []).append(order.pk)
+
+    # bulk inserts bypass checkout, so the sales rollups are computed from the history
+    rebuild_sales_rollups(batch_size)
+    return data
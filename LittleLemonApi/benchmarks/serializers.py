@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from ..models import Cart, MenuItem, Order
+from ..serializers import CartSerializer, MenuItemSerializer, OrderDetailSerializer, OrderSerializer, fast_cart, \
+    fast_menu_items, fast_order_details, fast_orders
+
+
+def _busiest_customer(data):
+    return max(data.orders, key=lambda customer_id: len(data.orders[customer_id]))
+
+
+# name -> (serializer, fast path, queryset for the serializer, queryset for the fast path)
+CASES = {
+    'menu-items': (MenuItemSerializer, fast_menu_items,
+                   lambda data: MenuItem.objects.order_by('id'), lambda data: MenuItem.objects.order_by('id')),
+    'cart': (CartSerializer, fast_cart,
+             lambda data: Cart.objects.order_by('id'), lambda data: Cart.objects.order_by('id')),
+    'orders': (OrderSerializer, fast_orders,
+               lambda data: Order.objects.order_by('-date', 'id'), lambda data: Order.objects.order_by('-date', 'id')),
+    'order-details': (OrderDetailSerializer, fast_order_details,
+                      lambda data: Order.objects.filter(user_id=_busiest_customer(data)).prefetch_related('items'),
+                      lambda data: Order.objects.filter(user_id=_busiest_customer(data))),
+}
+
+
+def _time(build, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = build()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), payload
+
+
+def run(data, repeat, only=None):
+    """
+    Times building each list response, query included, through the DRF
+    serializer and through its values_list fast path, and checks that both
+    render to the same bytes.
+    """
+    renderer = JSONRenderer()
+    results = {}
+    for name, (serializer_class, fast, queryset, fast_queryset) in CASES.items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        drf, expected = _time(lambda: serializer_class(queryset(data), many=True).data, repeat)
+        fast_time, payload = _time(lambda: fast.list(fast_queryset(data)), repeat)
+        results[name] = {
+            'rows': len(expected),
+            'drf_ms': round(drf * 1000, 3),
+            'fast_ms': round(fast_time * 1000, 3),
+            'speedup': round(drf / fast_time, 2) if fast_time else 0.0,
+            'identical': renderer.render(payload) == renderer.render(expected),
+        }
+    return results
@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import Cart, MenuItem
+from .versions import bump_version, cart_scope
+
+
+class UnknownMenuItems(Exception):
+    def __init__(self, ids):
+        super().__init__(ids)
+        self.ids = ids
+
+
+class PriceTooLarge(UnknownMenuItems):
+    """The quantity of these menu items would make a line price Cart.price cannot store."""
+
+
+def max_decimal(field):
+    # the largest value a DecimalField can store
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - Decimal(10) ** -field.decimal_places
+
+
+def update_cart(user, quantities):
+    """
+    Sets the quantity of many menu items in the user's cart at once; a
+    quantity of 0 removes the item. Prices are taken from the menu, never
+    from the client. Whatever the number of items this is one lookup of the
+    menu items, one upsert on the (menuitem, user) constraint and one DELETE.
+    """
+    prices = dict(MenuItem.objects.filter(pk__in=list(quantities)).values_list('id', 'price'))
+    unknown = sorted(set(quantities) - set(prices))
+    if unknown:
+        raise UnknownMenuItems(unknown)
+    max_price = max_decimal(Cart._meta.get_field('price'))
+    too_large = sorted(menuitem_id for menuitem_id, quantity in quantities.items()
+                       if prices[menuitem_id] * quantity > max_price)
+    if too_large:
+        raise PriceTooLarge(too_large)
+
+    # the transaction starts with a write, so on SQLite it waits for the write
+    # lock instead of failing to upgrade a read lock held since the lookup
+    with transaction.atomic():
+        Cart.objects.bulk_create(
+            [Cart(user=user, menuitem_id=menuitem_id, quantity=quantity, unit_price=prices[menuitem_id],
+                  price=prices[menuitem_id] * quantity)
+             for menuitem_id, quantity in quantities.items() if quantity],
+            update_conflicts=True, unique_fields=['menuitem', 'user'],
+            update_fields=['quantity', 'unit_price', 'price'],
+        )
+        removed = [menuitem_id for menuitem_id, quantity in quantities.items() if not quantity]
+        if removed:
+            Cart.objects.filter(user=user, menuitem_id__in=removed).delete()
+
+    bump_version(cart_scope(user.id))
+
+
+def clear_cart(user):
+    # Cart has no delete signals or dependent rows, so this is a single DELETE
+    Cart.objects.filter(user=user).delete()
+    bump_version(cart_scope(user.id))
@@ -0,0 +1,59 @@
+from hashlib import md5
+from threading import Lock
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import metrics
+from .models import Category, MenuItem, bulk_changed
+from .versions import bump_version, get_version, shared_cache
+
+CATALOG = 'catalog'
+
+# hit/miss counters of this worker process
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = Lock()
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+    metrics.inc('catalog_cache_total', outcome=outcome)
+
+
+def get_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def cached(parts, build, timeout=None):
+    """
+    Returns the payload cached for ``parts`` under the current catalog version,
+    calling ``build()`` and storing its result on a miss. Any write to a menu
+    item or category moves the catalog to a new version, so stale payloads are
+    never served; they simply expire.
+    """
+    cache = shared_cache()
+    key = f'catalog:{get_version(CATALOG)}:' + md5(repr(parts).encode()).hexdigest()
+    data = cache.get(key)
+    if data is not None:
+        _record('hits')
+        return data
+    _record('misses')
+    data = build()
+    cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT if timeout is None else timeout)
+    return data
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(bulk_changed, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(bulk_changed, sender=Category)
+def _catalog_changed(sender, using=None, **kwargs):
+    # only once the write is committed: bumped any earlier, a concurrent request
+    # could still read the old rows and cache them under the new version
+    transaction.on_commit(lambda: bump_version(CATALOG), using=using)
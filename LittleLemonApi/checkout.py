@@ -0,0 +1,77 @@
+import time
+from datetime import date
+
+from django.db import transaction
+from django.db.models import F
+
+from . import metrics, sales
+from .cart import max_decimal
+from .models import Cart, Order, OrderItem
+from .versions import bump_orders, bump_version, cart_scope
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class CheckoutConflict(Exception):
+    """Another checkout consumed (part of) the same cart first."""
+
+
+class TotalTooLarge(Exception):
+    """The cart adds up to more than Order.total can store."""
+
+
+def place_order(user):
+    """
+    Turns the user's cart into an order in a single transaction with a fixed
+    number of queries: claim and read the cart, insert the order, bulk insert
+    its items, delete the cart rows that were read and add the order to the
+    sales rollups. Either all of it is committed or none of it is.
+    """
+    start = time.perf_counter()
+    outcome = 'failed'
+    try:
+        with transaction.atomic():
+            # the transaction starts with a write claiming the cart rows, so on SQLite
+            # it waits for the write lock instead of failing to upgrade a read lock
+            if not Cart.objects.filter(user=user).update(quantity=F('quantity')):
+                raise EmptyCart
+            carts = list(
+                Cart.objects.filter(user=user)
+                .values_list('id', 'menuitem_id', 'quantity', 'unit_price', 'price', 'menuitem__category_id')
+            )
+
+            total = sum(price for _, _, _, _, price, _ in carts)
+            if total > max_decimal(Order._meta.get_field('total')):
+                raise TotalTooLarge
+            order = Order.objects.create(user=user, total=total, date=date.today())
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menuitem_id=menuitem_id, quantity=quantity, unit_price=unit_price, price=price)
+                for _, menuitem_id, quantity, unit_price, price, _ in carts
+            ])
+
+            # only delete the rows this order was built from; if a concurrent
+            # checkout got to them first, roll everything back
+            deleted, _ = Cart.objects.filter(pk__in=[cart_id for cart_id, *_ in carts]).delete()
+            if deleted != len(carts):
+                raise CheckoutConflict
+
+            sales.record_order(order, [(menuitem_id, category_id, quantity, price)
+                                       for _, menuitem_id, quantity, _, price, category_id in carts])
+        outcome = 'created'
+    except EmptyCart:
+        outcome = 'empty'
+        raise
+    except CheckoutConflict:
+        outcome = 'conflict'
+        raise
+    except TotalTooLarge:
+        outcome = 'too_large'
+        raise
+    finally:
+        metrics.observe('checkout_duration_seconds', time.perf_counter() - start, outcome=outcome)
+
+    bump_version(cart_scope(user.id))
+    bump_orders(user.id)
+    return order
@@ -0,0 +1,66 @@
+from functools import wraps
+from hashlib import md5
+from math import ceil
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .routers import use_primary
+from .versions import changed_within, get_version
+
+
+def _etag_matches(if_none_match, etag):
+    if if_none_match.strip() == '*':
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    # compressed responses carry a weak version of the same tag
+    return etag in tags or 'W/' + etag in tags
+
+
+def conditional_get(scope):
+    """
+    Adds ETag/Last-Modified headers to a GET handler and answers 304 Not
+    Modified when the client already has the current representation. Both
+    headers come from the version marker of ``scope`` (a scope name, or a
+    callable taking the request and URL kwargs), so a matching request is
+    answered without running the handler, its queries or its serializer.
+    Data that changed in the last REPLICA_MAX_LAG seconds is read from the
+    primary database, as replicas may not have the change yet.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return handler(self, request, *args, **kwargs)
+
+            name = scope(request, **kwargs) if callable(scope) else scope
+            version = get_version(name)
+            fingerprint = f'{name}:{version}:{request.user.pk}:{request.accepted_renderer.format}:' \
+                          f'{request.get_full_path()}'
+            etag = '"%s"' % md5(fingerprint.encode()).hexdigest()
+            last_modified = ceil(version / 1_000_000)
+
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+            if if_none_match is not None:
+                not_modified = _etag_matches(if_none_match, etag)
+            else:
+                since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+                not_modified = since is not None and last_modified <= since
+
+            if not_modified:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            elif changed_within(version, settings.REPLICA_MAX_LAG):
+                with use_primary():
+                    response = handler(self, request, *args, **kwargs)
+            else:
+                response = handler(self, request, *args, **kwargs)
+            if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+                patch_vary_headers(response, ['Authorization'])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,4 @@
+def is_lock_contention(error):
+    """Whether an OperationalError only means another connection held the write lock past the busy timeout."""
+    message = str(error).lower()
+    return 'database is locked' in message or 'database table is locked' in message
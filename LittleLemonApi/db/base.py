@@ -0,0 +1,37 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'EXCLUSIVE', 'IMMEDIATE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Django's SQLite backend plus the two OPTIONS Django 5.1 adds to it:
+    ``init_command``, ';'-separated statements (PRAGMAs) run on every new
+    connection, and ``transaction_mode``, the BEGIN mode of atomic blocks.
+    With IMMEDIATE a transaction takes the write lock when it starts, so it
+    waits for the busy timeout instead of failing with "database is locked"
+    when it cannot upgrade its read lock halfway through. On Django 5.1 the
+    ENGINE can go back to django.db.backends.sqlite3 with the same OPTIONS.
+    """
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('init_command', None)
+        transaction_mode = kwargs.pop('transaction_mode', None)
+        if transaction_mode is not None and transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f'settings.DATABASES has an invalid transaction_mode {transaction_mode!r}; '
+                                       f'use one of {", ".join(TRANSACTION_MODES)}.')
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        init_command = self.settings_dict['OPTIONS'].get('init_command') or ''
+        for statement in init_command.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        transaction_mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {transaction_mode.upper()}' if transaction_mode else 'BEGIN')
@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Order, OrderItem
+
+ORDER_FIELDS = ('id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date')
+ITEM_FIELDS = ('id', 'menuitem_id', 'quantity', 'unit_price', 'price')
+CSV_HEADER = ['order_' + name for name in ORDER_FIELDS] + ['item_' + name for name in ITEM_FIELDS]
+FORMATS = ('ndjson', 'csv')
+CHUNK_SIZE = 1000
+
+
+def iter_order_chunks(queryset=None, after_id=None, chunk_size=CHUNK_SIZE):
+    """
+    Yields lists of ``(order, items)`` pairs in order id order. Orders are read
+    ``chunk_size`` at a time by walking the primary key, and the items of each
+    chunk come from one query, so only a single chunk is ever held in memory.
+    Passing the last exported order id as ``after_id`` resumes an export.
+    """
+    if queryset is None:
+        queryset = Order.objects.all()
+    queryset = queryset.order_by('id').values(*ORDER_FIELDS)
+    last_id = after_id or 0
+    while True:
+        orders = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not orders:
+            return
+        items = defaultdict(list)
+        order_items = OrderItem.objects.filter(order_id__in=[order['id'] for order in orders]) \
+            .order_by('id').values_list('order_id', *ITEM_FIELDS)
+        for order_id, *values in order_items:
+            items[order_id].append(dict(zip(ITEM_FIELDS, values)))
+        yield [(order, items[order['id']]) for order in orders]
+        last_id = orders[-1]['id']
+
+
+def ndjson_chunks(chunks):
+    # one JSON document per order, with its items nested
+    for chunk in chunks:
+        yield ''.join(json.dumps({**order, 'items': items}, cls=DjangoJSONEncoder) + '\n' for order, items in chunk)
+
+
+def csv_chunks(chunks):
+    # one row per order item, repeating the order columns; orders without items get one row
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # sent on its own so that an export matching no orders still has it
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    empty_item = [''] * len(ITEM_FIELDS)
+    for chunk in chunks:
+        for order, items in chunk:
+            order_row = [order[name] for name in ORDER_FIELDS]
+            if not items:
+                writer.writerow(order_row + empty_item)
+            for item in items:
+                writer.writerow(order_row + [item[name] for name in ITEM_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_orders(output_format, queryset=None, after_id=None, chunk_size=CHUNK_SIZE):
+    chunks = iter_order_chunks(queryset, after_id=after_id, chunk_size=chunk_size)
+    if output_format == 'csv':
+        return csv_chunks(chunks)
+    return ndjson_chunks(chunks)
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Max, Q
+
+from .models import OrderEvent
+from .renderers import FastJSONRenderer
+from .roles import DELIVERY_CREW, MANAGER, get_roles
+from .serializers import fast_order_events
+from .versions import get_version, orders_scope
+
+_DONE = object()
+
+
+def record_event(order, kind):
+    """Appends the order's current status and delivery crew to the change log."""
+    return OrderEvent.objects.create(order=order, user_id=order.user_id, delivery_crew_id=order.delivery_crew_id,
+                                     kind=kind, status=order.status)
+
+
+class OrderFeed:
+    """
+    The order events one user may see after a cursor (an event id): all of
+    them for managers, those of the orders assigned to them for the delivery
+    crew and those of their own orders for customers. The events table is
+    only queried once the orders version marker of that audience moved, so
+    waiting clients cost one shared cache read per poll.
+    """
+
+    def __init__(self, request, cursor=None):
+        roles = get_roles(request)
+        user = request.user
+        if MANAGER in roles or user.is_staff:
+            self.visible, self.scope = Q(), orders_scope()
+        elif DELIVERY_CREW in roles:
+            self.visible, self.scope = Q(delivery_crew_id=user.pk), orders_scope()
+        else:
+            self.visible, self.scope = Q(user_id=user.pk), orders_scope(user.pk)
+        self.version = None
+        # without a cursor the feed starts after the latest event
+        self.cursor = cursor if cursor is not None else \
+            OrderEvent.objects.filter(self.visible).aggregate(latest=Max('pk'))['latest'] or 0
+
+    def read(self):
+        """Returns the next events after the cursor and moves the cursor past them."""
+        version = get_version(self.scope)
+        if version == self.version:
+            return []
+        page_size = settings.ORDER_FEED_PAGE_SIZE
+        events = fast_order_events.list(
+            OrderEvent.objects.filter(self.visible, pk__gt=self.cursor).order_by('pk')[:page_size])
+        if len(events) < page_size:
+            # caught up with this version; wait for the next one
+            self.version = version
+        if events:
+            self.cursor = events[-1]['id']
+        return events
+
+
+# Waiting responses are generators yielding a chunk to send or None to wait
+# ORDER_FEED_POLL_INTERVAL seconds; stream() sleeps in a worker thread under
+# WSGI and on the event loop under ASGI, where no thread waits with them.
+
+def long_poll(feed, wait):
+    """Yields the events once there are any, or no events after ``wait`` seconds, as one JSON body."""
+    deadline = time.monotonic() + wait
+    events = feed.read()
+    while not events and time.monotonic() < deadline:
+        yield None
+        events = feed.read()
+    yield FastJSONRenderer().render({'events': events, 'cursor': feed.cursor})
+
+
+def _sse(event):
+    return b'id: %d\nevent: order\ndata: %s\n\n' % (event['id'], FastJSONRenderer().render(event))
+
+
+def event_stream(feed):
+    """
+    Yields each event as a Server-Sent Event (its id is the cursor the
+    client sends back as Last-Event-ID when it reconnects), a comment after
+    ORDER_FEED_KEEPALIVE idle seconds so proxies keep the connection open,
+    and ends after ORDER_FEED_STREAM_TIMEOUT seconds.
+    """
+    yield b'retry: %d\n\n' % (settings.ORDER_FEED_POLL_INTERVAL * 1000)
+    now = time.monotonic()
+    deadline, last_sent = now + settings.ORDER_FEED_STREAM_TIMEOUT, now
+    while now < deadline:
+        events = feed.read()
+        if events:
+            yield b''.join(_sse(event) for event in events)
+            last_sent = now
+        elif now - last_sent >= settings.ORDER_FEED_KEEPALIVE:
+            yield b': keepalive\n\n'
+            last_sent = now
+        yield None
+        now = time.monotonic()
+
+
+def _stream_sync(steps):
+    for chunk in steps:
+        if chunk is None:
+            time.sleep(settings.ORDER_FEED_POLL_INTERVAL)
+        else:
+            yield chunk
+
+
+async def _stream_async(steps):
+    while True:
+        # each step reads the database, so it runs in the thread sync views run in
+        chunk = await sync_to_async(next)(steps, _DONE)
+        if chunk is _DONE:
+            return
+        if chunk is None:
+            await asyncio.sleep(settings.ORDER_FEED_POLL_INTERVAL)
+        else:
+            yield chunk
+
+
+def stream(request, steps):
+    """The iterator for a StreamingHttpResponse sending ``steps`` to ``request``."""
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return _stream_async(steps)
+    return _stream_sync(steps)
@@ -0,0 +1,40 @@
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+TRUE_VALUES = ('1', 'true', 'True', 'yes')
+FALSE_VALUES = ('0', 'false', 'False', 'no')
+
+
+def parse_date_param(params, param):
+    value = params.get(param)
+    if value is None:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({param: 'Must be a date in YYYY-MM-DD format.'})
+    return parsed
+
+
+def filter_orders(queryset, params):
+    # status, date range, delivery crew and customer filters of the order listings
+    order_status = params.get('status')
+    if order_status is not None:
+        if order_status not in TRUE_VALUES + FALSE_VALUES:
+            raise ValidationError({'status': 'Must be true or false.'})
+        queryset = queryset.filter(status=order_status in TRUE_VALUES)
+
+    for param, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+        parsed = parse_date_param(params, param)
+        if parsed is not None:
+            queryset = queryset.filter(**{lookup: parsed})
+
+    for param in ('delivery_crew', 'user'):
+        value = params.get(param)
+        if value is not None:
+            if not value.isdigit():
+                raise ValidationError({param: 'Must be a user id.'})
+            queryset = queryset.filter(**{param + '_id': int(value)})
+    return queryset
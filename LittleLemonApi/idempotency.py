@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils import encoders
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def _replayable(status_code):
+    # conflicts, throttling and server errors are worth retrying, so they are not stored
+    return status_code < 500 and status_code not in (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+def _fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, cls=encoders.JSONEncoder)
+    return md5(f'{request.method} {request.path} {payload}'.encode()).hexdigest()
+
+
+def _claim(user, key, fingerprint):
+    """
+    Inserts the in-flight row for ``key``, or returns the existing row. The
+    unique (user, key) constraint makes exactly one of concurrent requests
+    win; expired rows and rows abandoned mid-request are taken over.
+    """
+    now = timezone.now()
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(user=user, key=key, fingerprint=fingerprint, created=now)
+            return None
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if existing is None:
+                continue
+            expired = existing.created < now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+            abandoned = existing.status_code is None and \
+                existing.created < now - timedelta(seconds=settings.IDEMPOTENCY_IN_FLIGHT_TIMEOUT)
+            if not (expired or abandoned):
+                return existing
+            IdempotencyKey.objects.filter(pk=existing.pk, created=existing.created).delete()
+    return existing
+
+
+def idempotent(handler):
+    """
+    Makes a POST handler safe to retry: the first response for a client's
+    ``Idempotency-Key`` header is stored (per user, for IDEMPOTENCY_KEY_TTL
+    seconds) and replayed for later requests with the same key, without
+    running the handler again. A duplicate arriving while the first request
+    is still running gets 409 with Retry-After; reusing a key for a different
+    request gets 422. Requests without the header are not affected.
+    """
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return handler(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'message': f'{HEADER} is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = _fingerprint(request)
+        existing = _claim(request.user, key, fingerprint)
+        if existing is not None:
+            if existing.fingerprint != fingerprint:
+                return Response({'message': f'{HEADER} was already used for a different request'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if existing.status_code is None:
+                return Response({'message': 'A request with this key is in progress'},
+                                status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+            data = json.loads(existing.response) if existing.response else None
+            return Response(data, status=existing.status_code, headers={'Idempotent-Replayed': 'true'})
+
+        stored = IdempotencyKey.objects.filter(user=request.user, key=key)
+        try:
+            response = handler(self, request, *args, **kwargs)
+        except BaseException:
+            stored.delete()
+            raise
+        if _replayable(response.status_code):
+            body = json.dumps(response.data, cls=encoders.JSONEncoder) if response.data is not None else ''
+            stored.update(status_code=response.status_code, response=body)
+        else:
+            stored.delete()
+        purge_in_background()
+        return response
+    return wrapper
+
+
+def purge_expired():
+    """Deletes every expired key in a single statement; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    deleted, _ = IdempotencyKey.objects.filter(created__lt=cutoff).delete()
+    return deleted
+
+
+_purge_lock = threading.Lock()
+_next_purge = time.monotonic() + settings.IDEMPOTENCY_PURGE_INTERVAL
+
+
+def _purge():
+    try:
+        purge_expired()
+    finally:
+        connection.close()
+
+
+def purge_in_background():
+    # at most one purge per IDEMPOTENCY_PURGE_INTERVAL per process, off the request thread
+    global _next_purge
+    if time.monotonic() < _next_purge or not _purge_lock.acquire(blocking=False):
+        return
+    try:
+        _next_purge = time.monotonic() + settings.IDEMPOTENCY_PURGE_INTERVAL
+        threading.Thread(target=_purge, daemon=True).start()
+    finally:
+        _purge_lock.release()
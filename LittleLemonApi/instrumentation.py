@@ -0,0 +1,121 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('LittleLemonApi.slow_requests')
+
+_profile = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = []
+        self.segments = Counter()
+        self._depth = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # database execute wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def db_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self):
+        # the same statement run again and again is usually an N+1 pattern
+        counts = Counter(sql for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+
+@contextmanager
+def segment(name):
+    """
+    Adds the time spent in the block to the ``name`` segment of the current
+    request's profile. Nested blocks of the same segment are only counted
+    once; without an active profile this does nothing.
+    """
+    profile = _profile.get()
+    if profile is None or profile._depth[name]:
+        yield
+        return
+    profile._depth[name] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.segments[name] += time.perf_counter() - start
+        profile._depth[name] -= 1
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Opt-in (settings.SQL_INSTRUMENTATION) per-request profiling: counts and
+    times every SQL statement, reports db/auth/serialize/total time in a
+    Server-Timing header and logs requests slower than
+    SLOW_REQUEST_THRESHOLD_MS, with their statements, to the
+    ``LittleLemonApi.slow_requests`` logger as JSON. Segments may overlap:
+    queries run while serializing count towards both db and serialize.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        total = time.perf_counter() - start
+
+        duplicates = profile.duplicates()
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={_ms(profile.db_time)};desc="{len(profile.queries)} queries, '
+            f'{sum(duplicates.values())} duplicate"',
+            f'auth;dur={_ms(profile.segments["auth"])}',
+            f'serialize;dur={_ms(profile.segments["serialize"])}',
+            f'total;dur={_ms(total)}',
+        ])
+
+        if total * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            logger.warning(json.dumps({
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'total_ms': _ms(total),
+                'db_ms': _ms(profile.db_time),
+                'auth_ms': _ms(profile.segments['auth']),
+                'serialize_ms': _ms(profile.segments['serialize']),
+                'query_count': len(profile.queries),
+                'duplicates': [{'sql': sql, 'count': count} for sql, count in duplicates.items()],
+                'statements': [{'sql': sql, 'ms': _ms(duration)} for sql, duration in profile.queries],
+            }))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; render here to time it
+        with segment('serialize'):
+            response.render()
+        return response
@@ -0,0 +1,149 @@
+import json
+import platform
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonApi.benchmarks import contention, routes, search, serializers
+from LittleLemonApi.benchmarks.environment import benchmark_database
+from LittleLemonApi.benchmarks.seed import seed
+from .seed_data import add_seed_arguments, seed_options
+
+
+class Command(BaseCommand):
+    help = ('Measures latency percentiles, throughput and SQL queries of every API route on seeded data, '
+            'or (--suite serializers) compares list serializers with their values_list fast paths, '
+            'or (--suite contention) runs parallel writers and readers with and without the production '
+            'SQLite profile, or (--suite search) compares menu search through FTS5 with LIKE scans.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', choices=('routes', 'serializers', 'contention', 'search'), default='routes')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Runs per serializer or search query (serializers and search suites).')
+        parser.add_argument('--items', type=int, default=100_000,
+                            help='Menu items to seed instead of --menu-items (search suite).')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Seconds per database profile (contention suite).')
+        parser.add_argument('--writers', type=int, default=2,
+                            help='Checkout threads, and as many cart update threads (contention suite).')
+        parser.add_argument('--readers', type=int, default=4, help='Menu browsing threads (contention suite).')
+        parser.add_argument('--profile', choices=('default', 'production'), action='append', dest='profiles',
+                            help='Only run this database profile (contention suite, repeatable).')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per route.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads per route.')
+        parser.add_argument('--route', action='append', dest='routes',
+                            help='Only run routes (or serializer cases) whose name contains this text (repeatable).')
+        parser.add_argument('--output', help='Save the results as a JSON baseline.')
+        parser.add_argument('--compare', help='Baseline JSON to check the results against.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative slowdown before a route counts as a regression.')
+        add_seed_arguments(parser)
+
+    def handle(self, *args, **options):
+        if options['suite'] == 'serializers':
+            return self.handle_serializers(options)
+        if options['suite'] == 'contention':
+            return self.handle_contention(options)
+        if options['suite'] == 'search':
+            return self.handle_search(options)
+
+        with benchmark_database():
+            data = seed(**seed_options(options))
+            results = routes.run(data, options['requests'], options['concurrency'], only=options['routes'])
+
+        self.stdout.write(f'{"route":<52} {"p50":>8} {"p95":>8} {"p99":>8} {"rps":>8} {"queries":>8} {"errors":>7}')
+        for name, result in results.items():
+            self.stdout.write(f'{name:<52} {result["p50_ms"]:>8} {result["p95_ms"]:>8} {result["p99_ms"]:>8} '
+                              f'{result["throughput_rps"]:>8} {result["queries"]:>8} {result["errors"]:>7}')
+            for message, count in result['exceptions'].items():
+                self.stderr.write(f'  {count} x {message}')
+
+        if options['output']:
+            report = {
+                'meta': {
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'requests': options['requests'],
+                    'concurrency': options['concurrency'],
+                    'seed': seed_options(options),
+                },
+                'routes': results,
+            }
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        failed = [name for name, result in results.items() if not result['requests']]
+        if failed:
+            raise CommandError('No request completed for: %s' % ', '.join(failed))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = routes.compare(results, baseline['routes'], options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against %s:\n  %s' % (options['compare'], '\n  '.join(regressions)))
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}.'))
+
+    def handle_serializers(self, options):
+        if options['compare']:
+            raise CommandError('--compare only applies to the routes suite.')
+        with benchmark_database():
+            data = seed(**seed_options(options))
+            results = serializers.run(data, options['repeat'], only=options['routes'])
+
+        self.stdout.write(f'{"serializer":<16} {"rows":>6} {"drf ms":>9} {"fast ms":>9} {"speedup":>8} {"identical":>10}')
+        for name, result in results.items():
+            self.stdout.write(f'{name:<16} {result["rows"]:>6} {result["drf_ms"]:>9} {result["fast_ms"]:>9} '
+                              f'{result["speedup"]:>7}x {str(result["identical"]):>10}')
+        if not all(result['identical'] for result in results.values()):
+            raise CommandError('The fast path output differs from the serializer output.')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'repeat': options['repeat'],
+                                    'seed': seed_options(options)},
+                           'serializers': results}, f, indent=2)
+
+    def handle_contention(self, options):
+        if options['compare']:
+            raise CommandError('--compare only applies to the routes suite.')
+        profiles = {'default': contention.DEFAULT_PROFILE, 'production': settings.SQLITE_PRODUCTION_PROFILE}
+        results = {}
+        for name in options['profiles'] or profiles:
+            with benchmark_database(profiles[name]):
+                data = seed(**seed_options(options))
+                results[name] = contention.run(data, options['duration'], options['writers'], options['readers'])
+
+        self.stdout.write(f'{"profile":<12} {"workload":<10} {"rps":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"errors":>7}')
+        for name, workloads in results.items():
+            for workload, result in workloads.items():
+                self.stdout.write(f'{name:<12} {workload:<10} {result["throughput_rps"]:>8} {result["p50_ms"]:>8} '
+                                  f'{result["p95_ms"]:>8} {result["p99_ms"]:>8} {result["errors"]:>7}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                                    'duration': options['duration'], 'writers': options['writers'],
+                                    'readers': options['readers'], 'seed': seed_options(options)},
+                           'profiles': results}, f, indent=2)
+
+    def handle_search(self, options):
+        if options['compare']:
+            raise CommandError('--compare only applies to the routes suite.')
+        with benchmark_database():
+            seed(**{**seed_options(options), 'menu_items': options['items']})
+            results = search.run(options['repeat'], only=options['routes'])
+
+        self.stdout.write(f'{"query":<14} {"like ms":>9} {"fts ms":>9} {"speedup":>8} {"like rows":>10} {"fts rows":>9}')
+        for text, result in results.items():
+            self.stdout.write(f'{text:<14} {result["like_ms"]:>9} {result["fts_ms"]:>9} {result["speedup"]:>7}x '
+                              f'{result["like_matches"]:>10} {result["fts_matches"]:>9}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'repeat': options['repeat'],
+                                    'items': options['items'], 'seed': seed_options(options)},
+                           'queries': results}, f, indent=2)
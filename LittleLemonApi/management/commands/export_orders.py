@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from LittleLemonApi.export import CHUNK_SIZE, FORMATS, export_orders
+from LittleLemonApi.filters import filter_orders
+from LittleLemonApi.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Streams orders and their items as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--date-from', help='First order date to export (YYYY-MM-DD).')
+        parser.add_argument('--date-to', help='Last order date to export (YYYY-MM-DD).')
+        parser.add_argument('--status', help='Only export delivered (true) or pending (false) orders.')
+        parser.add_argument('--after-id', type=int, default=0, help='Resume after this order id.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--output', help='File to write to; defaults to stdout.')
+
+    def handle(self, *args, **options):
+        params = {
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+            'status': options['status'],
+        }
+        try:
+            queryset = filter_orders(Order.objects.all(), {k: v for k, v in params.items() if v is not None})
+        except ValidationError as e:
+            raise CommandError('; '.join(f'{field}: {message}' for field, message in e.detail.items()))
+
+        chunks = export_orders(options['format'], queryset, after_id=options['after_id'],
+                               chunk_size=options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+                self.stdout.flush()
+            return
+        with open(options['output'], 'w', newline='') as out:
+            for chunk in chunks:
+                out.write(chunk)
+                out.flush()
@@ -0,0 +1,53 @@
+import glob
+import io
+import json
+import os
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonApi.profiling import route_slug
+
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+
+class Command(BaseCommand):
+    help = 'Merges the per-process request profiles written by ProfilingMiddleware and summarizes them per route.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--route', help='Only summarize routes containing this text.')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='cumulative')
+        parser.add_argument('--limit', type=int, default=25, help='Functions to list per route.')
+        parser.add_argument('--output-dir', help='Also write each merged profile to this directory.')
+        parser.add_argument('--clear', action='store_true', help='Delete the profiles after summarizing them.')
+
+    def handle(self, *args, **options):
+        routes = {}
+        for meta_path in sorted(glob.glob(os.path.join(settings.PROFILE_DIR, '*.json'))):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            entry = routes.setdefault(meta['route'], {'requests': 0, 'files': []})
+            entry['requests'] += meta['requests']
+            entry['files'].append(meta_path[:-len('.json')])
+        if options['route']:
+            routes = {route: entry for route, entry in routes.items() if options['route'] in route}
+        if not routes:
+            raise CommandError(f'No profiles found in {settings.PROFILE_DIR}.')
+
+        for route, entry in sorted(routes.items()):
+            # pstats writes piecemeal, which OutputWrapper would break into lines
+            buffer = io.StringIO()
+            stats = pstats.Stats(*[path + '.prof' for path in entry['files']], stream=buffer)
+            self.stdout.write(f'== {route}: {entry["requests"]} requests, '
+                              f'{stats.total_tt / entry["requests"] * 1000:.1f} ms per request '
+                              f'({len(entry["files"])} processes)')
+            stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+            self.stdout.write(buffer.getvalue())
+            if options['output_dir']:
+                os.makedirs(options['output_dir'], exist_ok=True)
+                stats.dump_stats(os.path.join(options['output_dir'], route_slug(route) + '.prof'))
+            if options['clear']:
+                for path in entry['files']:
+                    os.remove(path + '.prof')
+                    os.remove(path + '.json')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonApi.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Deletes the stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Purged {purge_expired()} expired idempotency keys.')
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from LittleLemonApi.sales import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily, menu item and category sales rollups from the order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders aggregated per query.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f'Rebuilt the sales rollups from {count} orders in {time.perf_counter() - start:.1f}s.')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from LittleLemonApi.benchmarks.seed import DEFAULTS, PASSWORD, seed
+
+
+def add_seed_arguments(parser):
+    for name, default in DEFAULTS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=int, default=default)
+
+
+def seed_options(options):
+    return {name: options[name] for name in DEFAULTS}
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with a deterministic set of users, menu items, carts and orders.'
+
+    def add_arguments(self, parser):
+        add_seed_arguments(parser)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            data = seed(**seed_options(options))
+        self.stdout.write(
+            f'Created {len(data.managers)} managers, {len(data.delivery_crew)} delivery crew and '
+            f'{len(data.customers)} customers (password "{PASSWORD}"), {len(data.menu_items)} menu items '
+            f'and {sum(len(ids) for ids in data.orders.values())} orders.'
+        )
@@ -0,0 +1,39 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Copies a consistent snapshot of the primary SQLite database into the replica files '
+            '(settings.DATABASE_REPLICAS, or the given paths), once or every --interval seconds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Replica files; defaults to the configured replicas.')
+        parser.add_argument('--interval', type=float, help='Keep syncing, waiting this many seconds in between.')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [str(settings.DATABASES[alias]['NAME']) for alias in settings.DATABASE_REPLICAS]
+        if not paths:
+            raise CommandError('No replicas configured; set LITTLELEMON_REPLICAS or pass the replica files.')
+        while True:
+            start = time.perf_counter()
+            self.sync(paths)
+            self.stdout.write(f'Synced {len(paths)} replica(s) in {(time.perf_counter() - start) * 1000:.1f}ms.')
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    def sync(self, paths):
+        primary = connections['default']
+        primary.ensure_connection()
+        for path in paths:
+            replica = sqlite3.connect(path)
+            try:
+                # the backup API copies the pages of one read transaction, so the copy is consistent
+                primary.connection.backup(replica)
+            finally:
+                replica.close()
+        primary.close()
@@ -0,0 +1,187 @@
+import atexit
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .sharedstore import SharedStore
+
+PREFIX = 'littlelemon_'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'request_duration_seconds': ('histogram', 'Request latency by route.', LATENCY_BUCKETS),
+    'requests_total': ('counter', 'Requests by route and status code.', None),
+    'request_queries': ('histogram', 'SQL queries per request by route.', QUERY_BUCKETS),
+    'throttled_total': ('counter', 'Requests rejected by a throttle, by throttle scope.', None),
+    'checkout_duration_seconds': ('histogram', 'Checkout duration by outcome.', LATENCY_BUCKETS),
+    'catalog_cache_total': ('counter', 'Catalog cache lookups by outcome.', None),
+}
+
+store = SharedStore('''
+    CREATE TABLE IF NOT EXISTS metric (
+        name TEXT NOT NULL,
+        labels TEXT NOT NULL,
+        le TEXT NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (name, labels, le)
+    ) WITHOUT ROWID;
+''')
+
+# values recorded by this process since the last flush
+_counters = {}
+_histograms = {}
+_lock = Lock()
+_next_flush = 0.0
+
+
+def inc(name, value=1, **labels):
+    key = (name, tuple(labels.items()))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    key = (name, tuple(labels.items()))
+    buckets = METRICS[name][2]
+    with _lock:
+        counts = _histograms.get(key)
+        if counts is None:
+            # one count per bucket, one for +Inf, then the sum
+            counts = _histograms[key] = [0] * (len(buckets) + 2)
+        counts[bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+
+def _render_labels(labels):
+    return ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels)
+
+
+def flush():
+    """
+    Adds everything this process recorded since the last flush to the shared
+    store, so that /metrics reports the sum over all worker processes.
+    """
+    global _counters, _histograms, _next_flush
+    with _lock:
+        counters, _counters = _counters, {}
+        histograms, _histograms = _histograms, {}
+        _next_flush = time.monotonic() + settings.METRICS_FLUSH_INTERVAL
+    rows = [(name, _render_labels(labels), '', value) for (name, labels), value in counters.items()]
+    for (name, labels), counts in histograms.items():
+        labels = _render_labels(labels)
+        bounds = [str(bound) for bound in METRICS[name][2]] + ['+Inf', 'sum']
+        rows.extend((name, labels, le, value) for le, value in zip(bounds, counts) if value)
+    if not rows:
+        return
+    conn = store.connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany('INSERT INTO metric (name, labels, le, value) VALUES (?, ?, ?, ?) '
+                         'ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value', rows)
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+atexit.register(flush)
+
+
+def flush_if_due():
+    if time.monotonic() >= _next_flush:
+        flush()
+
+
+def reset():
+    global _counters, _histograms
+    with _lock:
+        _counters, _histograms = {}, {}
+    store.reset('metric')
+
+
+def _series(name, labels, extra=''):
+    labels = ','.join(part for part in (labels, extra) if part)
+    return f'{PREFIX}{name}{{{labels}}}' if labels else f'{PREFIX}{name}'
+
+
+def exposition():
+    """Renders the shared store in the Prometheus text exposition format."""
+    stored = {}
+    for name, labels, le, value in store.connection().execute(
+            'SELECT name, labels, le, value FROM metric ORDER BY name, labels'):
+        stored.setdefault(name, {}).setdefault(labels, {})[le] = value
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {PREFIX}{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}{name} {kind}')
+        for labels, values in stored.get(name, {}).items():
+            if kind == 'counter':
+                lines.append(f"{_series(name, labels)} {values['']:g}")
+                continue
+            cumulative = 0
+            for le in [str(bound) for bound in buckets] + ['+Inf']:
+                cumulative += values.get(le, 0)
+                bucket = _series(name + '_bucket', labels, 'le="%s"' % le)
+                lines.append(f'{bucket} {cumulative:g}')
+            lines.append(f"{_series(name + '_sum', labels)} {values.get('sum', 0):g}")
+            lines.append(f"{_series(name + '_count', labels)} {cumulative:g}")
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    flush()
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def route_name(request):
+    match = request.resolver_match
+    # router URLs are regular expressions, e.g. 'api/orders$'
+    return match.route.rstrip('$') if match is not None else 'unmatched'
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status and query count of every request under its URL
+    route (e.g. ``api/orders/<str:orderId>``) and periodically flushes them to
+    the shared store.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        route = route_name(request)
+        observe('request_duration_seconds', duration, route=route, method=request.method)
+        observe('request_queries', queries.count, route=route, method=request.method)
+        inc('requests_total', route=route, method=request.method, status=response.status_code)
+        flush_if_due()
+        return response
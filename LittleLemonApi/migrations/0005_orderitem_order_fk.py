@@ -0,0 +1,92 @@
+# Generated by Django 4.2.3 on 2026-10-17 00:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_items_to_orders(apps, schema_editor):
+    """
+    OrderItem.order used to point at the ordering user. Checkout created the
+    order first and then its items, so walking a user's orders and items in id
+    order and cutting the item sequence wherever the running price matches the
+    order total recovers which order each item belongs to.
+    """
+    Order = apps.get_model('LittleLemonApi', 'Order')
+    OrderItem = apps.get_model('LittleLemonApi', 'OrderItem')
+
+    user_ids = OrderItem.objects.values_list('legacy_user_id', flat=True).distinct()
+    for user_id in list(user_ids):
+        orders = list(Order.objects.filter(user_id=user_id).order_by('id').values_list('id', 'total'))
+        items = list(OrderItem.objects.filter(legacy_user_id=user_id).order_by('id').values_list('id', 'price'))
+        if not orders:
+            # items of a user without any order cannot be attached to anything
+            OrderItem.objects.filter(id__in=[item_id for item_id, _ in items]).delete()
+            continue
+
+        position = 0
+        for order_id, total in orders:
+            batch, running = [], 0
+            while position < len(items) and running < total:
+                item_id, price = items[position]
+                batch.append(item_id)
+                running += price
+                position += 1
+            if batch:
+                OrderItem.objects.filter(id__in=batch).update(order_id=order_id)
+        if position < len(items):
+            # totals did not line up; keep the leftovers on the most recent order
+            leftovers = [item_id for item_id, _ in items[position:]]
+            OrderItem.objects.filter(id__in=leftovers).update(order_id=orders[-1][0])
+
+
+def link_items_to_users(apps, schema_editor):
+    Order = apps.get_model('LittleLemonApi', 'Order')
+    OrderItem = apps.get_model('LittleLemonApi', 'OrderItem')
+    OrderItem.objects.update(
+        legacy_user_id=models.Subquery(Order.objects.filter(pk=models.OuterRef('order_id')).values('user_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('LittleLemonApi', '0004_alter_cart_user'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='orderitem',
+            unique_together=set(),
+        ),
+        migrations.RenameField(
+            model_name='orderitem',
+            old_name='order',
+            new_name='legacy_user',
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='legacy_user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='LittleLemonApi.order'),
+        ),
+        migrations.RunPython(link_items_to_orders, link_items_to_users),
+        migrations.RemoveField(
+            model_name='orderitem',
+            name='legacy_user',
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='LittleLemonApi.order'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='orderitem',
+            unique_together={('order', 'menuitem')},
+        ),
+    ]
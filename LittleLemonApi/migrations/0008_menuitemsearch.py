@@ -0,0 +1,86 @@
+from django.db import migrations, models
+from django.db.utils import OperationalError
+import django.db.models.deletion
+
+SEARCH = 'LittleLemonApi_menuitem_search'
+MENU_ITEM = 'LittleLemonApi_menuitem'
+CATEGORY = 'LittleLemonApi_category'
+
+CREATE = [
+    # unicode61 folds case and accents; the prefix indexes make "ch"* and "chi"* lookups cheap
+    f"""CREATE VIRTUAL TABLE {SEARCH} USING fts5(
+        title, category, tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    f"""INSERT INTO {SEARCH} (rowid, title, category)
+        SELECT m.id, m.title, c.title FROM {MENU_ITEM} m JOIN {CATEGORY} c ON c.id = m.category_id""",
+    f"""CREATE TRIGGER {SEARCH}_insert AFTER INSERT ON {MENU_ITEM} BEGIN
+        INSERT INTO {SEARCH} (rowid, title, category)
+        SELECT new.id, new.title, title FROM {CATEGORY} WHERE id = new.category_id;
+    END""",
+    f"""CREATE TRIGGER {SEARCH}_update AFTER UPDATE OF title, category_id ON {MENU_ITEM} BEGIN
+        DELETE FROM {SEARCH} WHERE rowid = old.id;
+        INSERT INTO {SEARCH} (rowid, title, category)
+        SELECT new.id, new.title, title FROM {CATEGORY} WHERE id = new.category_id;
+    END""",
+    f"""CREATE TRIGGER {SEARCH}_delete AFTER DELETE ON {MENU_ITEM} BEGIN
+        DELETE FROM {SEARCH} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER {SEARCH}_category AFTER UPDATE OF title ON {CATEGORY} BEGIN
+        UPDATE {SEARCH} SET category = new.title
+        WHERE rowid IN (SELECT id FROM {MENU_ITEM} WHERE category_id = new.id);
+    END""",
+]
+
+DROP = [
+    f'DROP TRIGGER IF EXISTS {SEARCH}_category',
+    f'DROP TRIGGER IF EXISTS {SEARCH}_delete',
+    f'DROP TRIGGER IF EXISTS {SEARCH}_update',
+    f'DROP TRIGGER IF EXISTS {SEARCH}_insert',
+    f'DROP TABLE IF EXISTS {SEARCH}',
+]
+
+
+def create_search_index(apps, schema_editor):
+    # other databases (and SQLite builds without FTS5) search with LIKE instead
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute('SELECT fts5(NULL)')
+        except OperationalError:
+            return
+        for statement in CREATE:
+            cursor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in DROP:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonApi', '0007_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuItemSearch',
+            fields=[
+                ('menuitem', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING,
+                                                  primary_key=True, related_name='search', serialize=False,
+                                                  to='LittleLemonApi.menuitem')),
+                ('title', models.TextField()),
+                ('category', models.TextField()),
+                ('document', models.TextField(db_column='LittleLemonApi_menuitem_search')),
+            ],
+            options={
+                'db_table': 'LittleLemonApi_menuitem_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,6 +1,29 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.fields import related
+from django.dispatch import Signal
+
+
+# sent after queryset writes that skip the per-object model signals (update,
+# bulk_create, bulk_update), with the model as sender and ``using``
+bulk_changed = Signal()
+
+
+class BulkSignalQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        bulk_changed.send(sender=self.model, using=self.db)
+        return rows
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super().bulk_create(*args, **kwargs)
+        bulk_changed.send(sender=self.model, using=self.db)
+        return objs
+
+    def bulk_update(self, *args, **kwargs):
+        rows = super().bulk_update(*args, **kwargs)
+        bulk_changed.send(sender=self.model, using=self.db)
+        return rows
 
 
 class Category(models.Model):
@@ -10,6 +33,8 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = 'Categories'
 
+    objects = BulkSignalQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
@@ -20,6 +45,8 @@ class MenuItem(models.Model):
     featured = models.BooleanField(db_index=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
 
+    objects = BulkSignalQuerySet.as_manager()
+
 
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -39,9 +66,17 @@ class Order(models.Model):
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateField(db_index=True)
 
+    class Meta:
+        indexes = [
+            # manager and delivery crew listings filter on these and walk them by date
+            models.Index(fields=['delivery_crew', 'status', 'date'], name='order_crew_status_date_idx'),
+            models.Index(fields=['status', 'date'], name='order_status_date_idx'),
+            models.Index(fields=['user', 'date'], name='order_user_date_idx'),
+        ]
+
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(User, on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
@@ -49,3 +84,76 @@ class OrderItem(models.Model):
 
     class Meta:
         unique_together = ('order', 'menuitem')
+
+
+class OrderEvent(models.Model):
+    """Append-only log of order status and delivery crew changes; the ids are the order feed's cursor."""
+    STATUS = 'status'
+    DELIVERY_CREW = 'delivery_crew'
+
+    order = models.ForeignKey(Order, related_name='events', on_delete=models.CASCADE)
+    # the order's customer and crew when it changed, so every feed reads one index range
+    user = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    delivery_crew = models.ForeignKey(User, related_name='+', on_delete=models.SET_NULL, null=True)
+    kind = models.CharField(max_length=16, choices=[(STATUS, 'Status'), (DELIVERY_CREW, 'Delivery crew')])
+    status = models.BooleanField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='orderevent_user_idx'),
+            models.Index(fields=['delivery_crew', 'id'], name='orderevent_crew_idx'),
+        ]
+
+
+# Sales rollups: kept up to date by checkout and order deletion (see sales.py), rebuilt from
+# the order history by the rebuild_sales_rollups command
+
+class DailySales(models.Model):
+    date = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    items = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+
+class MenuItemSales(models.Model):
+    menuitem = models.OneToOneField(MenuItem, primary_key=True, on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0, db_index=True)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+
+class CategorySales(models.Model):
+    category = models.OneToOneField(Category, primary_key=True, on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # md5 of the method, path and payload the key was first used with
+    fingerprint = models.CharField(max_length=32)
+    # null while the first request with this key is still running
+    status_code = models.SmallIntegerField(null=True)
+    response = models.TextField(blank=True)
+    created = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+
+class MenuItemSearch(models.Model):
+    """
+    SQLite FTS5 index of menu item titles and their category titles, created
+    and kept in sync by the triggers of migration 0008; only ever joined to.
+    """
+    menuitem = models.OneToOneField(MenuItem, primary_key=True, db_column='rowid', related_name='search',
+                                    on_delete=models.DO_NOTHING)
+    title = models.TextField()
+    category = models.TextField()
+    # FTS5's hidden column named after the table; the left-hand side of MATCH
+    document = models.TextField(db_column='LittleLemonApi_menuitem_search')
+
+    class Meta:
+        managed = False
+        db_table = 'LittleLemonApi_menuitem_search'
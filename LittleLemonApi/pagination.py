@@ -0,0 +1,156 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+CURSOR_PARAM = 'cursor'
+MAX_PAGE_SIZE = 100
+
+
+def parse_ordering(value, fields, default='id'):
+    """
+    Turns an ``ordering`` query parameter (e.g. ``-price,title``) into a list of
+    ``(attname, descending)`` pairs. ``fields`` maps the public names clients may
+    order by to model attribute names. ``id`` is always appended as a tie-breaker
+    so that every position in the ordering is unique.
+    """
+    names = [name.strip() for name in (value or default).split(',') if name.strip()]
+    ordering = []
+    for name in names:
+        descending = name.startswith('-')
+        public = name.lstrip('-')
+        if public not in fields:
+            raise ValidationError({'ordering': f'Cannot order by "{public}".'})
+        ordering.append((fields[public], descending))
+    if not any(attname == 'id' for attname, _ in ordering):
+        # same direction as the last field so an index scan can serve both
+        ordering.append(('id', ordering[-1][1] if ordering else False))
+    return ordering
+
+
+def order_by_args(ordering):
+    return [('-' if descending else '') + attname for attname, descending in ordering]
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(ordering, values, reverse):
+    payload = {'o': order_by_args(ordering), 'v': [_json_value(v) for v in values], 'r': reverse}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _ordering_fields(queryset, ordering):
+    # model fields by attname, or the output field of an annotation (e.g. a search rank)
+    fields = []
+    for attname, _ in ordering:
+        annotation = queryset.query.annotations.get(attname)
+        fields.append(annotation.output_field if annotation is not None else
+                      queryset.model._meta.get_field(attname))
+    return fields
+
+
+def decode_cursor(token, ordering, fields=None):
+    """
+    Returns the position and direction encoded in ``token``. With ``fields``
+    (the model fields of ``ordering``) the values are converted by them, so a
+    tampered or stale cursor is rejected here rather than by the database.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        values, reverse = payload['v'], bool(payload['r'])
+        valid = payload['o'] == order_by_args(ordering) and len(values) == len(ordering)
+        if valid and fields is not None:
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+            valid = None not in values
+    except (binascii.Error, ValueError, TypeError, KeyError, DjangoValidationError):
+        valid = False
+    if not valid:
+        raise ValidationError({CURSOR_PARAM: 'Invalid cursor.'})
+    return values, reverse
+
+
+def keyset_filter(ordering, values, reverse):
+    """Builds the WHERE clause selecting rows strictly after (or before) a position."""
+    condition = Q()
+    equal = Q()
+    for (attname, descending), value in zip(ordering, values):
+        lookup = 'lt' if descending != reverse else 'gt'
+        condition |= equal & Q(**{f'{attname}__{lookup}': value})
+        equal &= Q(**{attname: value})
+    return condition
+
+
+def get_page_size(request, default):
+    try:
+        page_size = int(request.query_params.get('perpage', default))
+    except ValueError:
+        raise ValidationError({'perpage': 'A valid integer is required.'})
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    def __init__(self, results, next_cursor, previous_cursor):
+        self.results = results
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+
+def paginate_keyset(queryset, ordering, cursor, page_size):
+    """
+    Returns one page of ``queryset`` walked in ``ordering`` order, starting from
+    the opaque ``cursor`` (or the beginning). The database only ever reads
+    ``page_size + 1`` rows past an indexed position, whatever the page depth.
+    """
+    reverse = False
+    if cursor:
+        values, reverse = decode_cursor(cursor, ordering, _ordering_fields(queryset, ordering))
+        queryset = queryset.filter(keyset_filter(ordering, values, reverse))
+
+    walk = [(attname, descending != reverse) for attname, descending in ordering]
+    rows = list(queryset.order_by(*order_by_args(walk))[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    def position(row):
+        return [getattr(row, attname) for attname, _ in ordering]
+
+    next_cursor = previous_cursor = None
+    if rows:
+        # a backwards walk always started from a row further along
+        more_after = True if reverse else has_more
+        more_before = has_more if reverse else bool(cursor)
+        if more_after:
+            next_cursor = encode_cursor(ordering, position(rows[-1]), False)
+        if more_before:
+            previous_cursor = encode_cursor(ordering, position(rows[0]), True)
+    elif cursor:
+        # walked past either end; offer a way back
+        if reverse:
+            next_cursor = encode_cursor(ordering, values, False)
+        else:
+            previous_cursor = encode_cursor(ordering, values, True)
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    url = request.build_absolute_uri()
+    url = remove_query_param(url, 'page')
+    return replace_query_param(url, CURSOR_PARAM, cursor)
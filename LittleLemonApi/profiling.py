@@ -0,0 +1,100 @@
+import cProfile
+import json
+import marshal
+import os
+import pstats
+import random
+import re
+from threading import Lock
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedTokenAuthentication
+from .metrics import route_name
+
+# route -> {aggregated pstats.Stats, profiled requests, requests the files cover, lock
+# writing the files} of this worker process
+_profiles = {}
+_lock = Lock()
+
+
+def route_slug(route):
+    return re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+
+
+def _replace(path, data, mode):
+    # readers (profile_summary) never see a half-written file
+    with open(path + '.tmp', mode) as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def record(route, profiler):
+    """
+    Adds a request's profile to the route's aggregate and rewrites this
+    process's profile file for the route: ``<slug>.<pid>.prof`` plus a
+    ``.json`` with the route and number of requests it covers. Only the
+    aggregation holds the process-wide lock; files are written after it,
+    and a write older than the last one is skipped.
+    """
+    with _lock:
+        entry = _profiles.get(route)
+        if entry is None:
+            entry = _profiles[route] = {'stats': pstats.Stats(profiler), 'requests': 0, 'written': 0,
+                                        'lock': Lock()}
+        else:
+            entry['stats'].add(profiler)
+        entry['requests'] += 1
+        requests = entry['requests']
+        # what Stats.dump_stats() writes
+        snapshot = marshal.dumps(entry['stats'].stats)
+
+    with entry['lock']:
+        if requests <= entry['written']:
+            return
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        base = os.path.join(settings.PROFILE_DIR, f'{route_slug(route)}.{os.getpid()}')
+        _replace(base + '.prof', snapshot, 'wb')
+        _replace(base + '.json', json.dumps({'route': route, 'requests': requests}), 'w')
+        entry['written'] = requests
+
+
+def reset():
+    with _lock:
+        _profiles.clear()
+
+
+def _is_staff(request):
+    # the view has not authenticated the request yet; the token cache keeps this cheap
+    try:
+        credentials = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return credentials is not None and credentials[0].is_staff
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in (settings.PROFILING) cProfile sampling: profiles a
+    PROFILE_SAMPLE_RATE fraction of requests, and every request carrying the
+    PROFILE_HEADER with a staff user's token, and aggregates them per route
+    in PROFILE_DIR. See the profile_summary command.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = settings.PROFILE_HEADER
+
+    def __call__(self, request):
+        requested = self.header in request.headers and _is_staff(request)
+        if not requested and random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        record(route_name(request), profiler)
+        return response
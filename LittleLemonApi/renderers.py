@@ -0,0 +1,42 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson when it is installed, falling back to the
+    stock renderer otherwise. Output matches JSONRenderer's compact UTF-8
+    form: types orjson does not handle the same way (Decimal, dates and
+    times, UUIDs, lazy strings...) go through DRF's own JSONEncoder.
+    Indented output, requested through the media type, also uses the stock
+    renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+_default = encoders.JSONEncoder().default
+
+
+class EventStreamRenderer(JSONRenderer):
+    """
+    Lets clients ask for text/event-stream (Server-Sent Events). Views stream
+    the events themselves; this only renders what is returned instead of a
+    stream, such as errors, as a single ``error`` event.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b'event: error\ndata: ' + super().render(data, 'application/json', renderer_context) + b'\n\n'
@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .lru import LRUCache
+from .versions import auth_scope, bump_version, get_version
+
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery crew'
+
+# user id -> (frozenset of group names, auth version), shared by every request served by this process
+_user_roles = LRUCache(maxsize=getattr(settings, 'ROLE_CACHE_SIZE', 1024),
+                       ttl=getattr(settings, 'ROLE_CACHE_TTL', 60))
+# group name -> Group
+_groups = {}
+
+
+def _http_request(request):
+    # DRF wraps the Django request; keep the per-request copy on the inner one so
+    # every Request built around it (e.g. batched sub-requests) sees the same roles
+    return getattr(request, '_request', request)
+
+
+def get_roles(request):
+    http_request = _http_request(request)
+    roles = getattr(http_request, '_roles', None)
+    if roles is not None:
+        return roles
+
+    user = request.user
+    if user is None or not user.is_authenticated:
+        roles = frozenset()
+    else:
+        version = get_version(auth_scope(user.pk))
+        entry = _user_roles.get(user.pk)
+        if entry is not None and entry[1] == version:
+            roles = entry[0]
+        else:
+            roles = load_roles(user, version)
+    http_request._roles = roles
+    return roles
+
+
+def load_roles(user, version):
+    # version is the user's auth version read before loading, see invalidate_roles
+    roles = frozenset(user.groups.values_list('name', flat=True))
+    _user_roles.set(user.pk, (roles, version))
+    return roles
+
+
+def prime_roles(request, roles):
+    # roles already known from elsewhere (e.g. the authentication cache)
+    _http_request(request)._roles = roles
+
+
+def has_role(request, name):
+    return name in get_roles(request)
+
+
+def is_customer(request):
+    roles = get_roles(request)
+    return MANAGER not in roles and DELIVERY_CREW not in roles
+
+
+def get_group(name):
+    group = _groups.get(name)
+    if group is None:
+        group = Group.objects.get(name=name)
+        _groups[name] = group
+    return group
+
+
+def invalidate_roles(user):
+    user_id = getattr(user, 'pk', user)
+    _user_roles.pop(user_id)
+    # other processes find out through the version their entries were stored with
+    bump_version(auth_scope(user_id))
+
+
+def _member_ids(group):
+    return list(group.user_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def _membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # group.user_set.clear() does not tell post_clear which users were affected
+        instance._cleared_member_ids = _member_ids(instance)
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_roles(instance)
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_member_ids', ())
+    for user_id in pk_set or ():
+        invalidate_roles(user_id)
+
+
+@receiver(post_delete, sender=User)
+def _user_deleted(sender, instance, **kwargs):
+    invalidate_roles(instance)
+
+
+@receiver(pre_delete, sender=Group)
+def _group_deleting(sender, instance, **kwargs):
+    # the memberships are gone by post_delete
+    instance._deleted_member_ids = _member_ids(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def _group_changed(sender, instance, **kwargs):
+    _groups.clear()
+    # a renamed or deleted group changes its members' roles
+    member_ids = instance.__dict__.pop('_deleted_member_ids', None)
+    for user_id in member_ids if member_ids is not None else _member_ids(instance):
+        invalidate_roles(user_id)
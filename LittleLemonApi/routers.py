@@ -0,0 +1,69 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# models whose reads may be served by a replica; credentials, sessions and
+# idempotency keys must always be read where they were just written
+REPLICATED_MODELS = {'LittleLemonApi.Category', 'LittleLemonApi.MenuItem', 'LittleLemonApi.Cart',
+                     'LittleLemonApi.Order', 'LittleLemonApi.OrderItem', 'LittleLemonApi.DailySales',
+                     'LittleLemonApi.MenuItemSales', 'LittleLemonApi.CategorySales'}
+
+_use_primary = ContextVar('use_primary', default=False)
+
+
+@contextmanager
+def use_primary():
+    """Sends every read in the block (and in the code it calls) to the primary."""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends writes to the primary (``default``) and reads of the catalog, carts
+    and orders to a random one of settings.DATABASE_REPLICAS. Reads stay on
+    the primary inside a transaction, during unsafe (writing) requests and
+    inside ``use_primary()``, which conditional_get() enters for data that
+    changed less than REPLICA_MAX_LAG seconds ago, so a client reads its own
+    writes while the replicas catch up.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or model._meta.label not in REPLICATED_MODELS or _use_primary.get() \
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas are copies of the migrated primary (see the sync_replica command)
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+class ReplicaRoutingMiddleware:
+    """Keeps every read of a POST, PUT, PATCH or DELETE request on the primary."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return self.get_response(request)
+        with use_primary():
+            return self.get_response(request)
@@ -0,0 +1,104 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Sum
+
+from .models import CategorySales, DailySales, MenuItemSales, Order, OrderItem
+
+
+def _add(model, key, rows):
+    """
+    Adds ``rows`` ({key value: {column: delta}}) to the rollup table of
+    ``model`` with one INSERT ... ON CONFLICT DO UPDATE per row, so
+    concurrent checkouts never read-modify-write the same counters.
+    """
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    key_column = quote(model._meta.get_field(key).column)
+    columns = list(next(iter(rows.values())))
+    quoted = [quote(column) for column in columns]
+    sql = (f'INSERT INTO {table} ({key_column}, {", ".join(quoted)}) '
+           f'VALUES ({", ".join(["%s"] * (len(columns) + 1))}) '
+           f'ON CONFLICT ({key_column}) DO UPDATE SET '
+           + ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in quoted))
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [[value, *(deltas[column] for column in columns)] for value, deltas in rows.items()])
+
+
+def _apply(orders, lines, sign=1):
+    """
+    ``orders``: (date, total) per order; ``lines``: (date, menuitem id,
+    category id, quantity, price) per order item.
+    """
+    daily = defaultdict(lambda: {'orders': 0, 'items': 0, 'revenue': Decimal(0)})
+    items = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal(0)})
+    categories = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal(0)})
+    for day, total in orders:
+        daily[day]['orders'] += sign
+        daily[day]['revenue'] += sign * total
+    for day, menuitem_id, category_id, quantity, price in lines:
+        daily[day]['items'] += sign * quantity
+        for rollup in (items[menuitem_id], categories[category_id]):
+            rollup['quantity'] += sign * quantity
+            rollup['revenue'] += sign * price
+    _add(DailySales, 'date', daily)
+    _add(MenuItemSales, 'menuitem', items)
+    _add(CategorySales, 'category', categories)
+
+
+def record_order(order, lines):
+    """Adds a new order and its (menuitem id, category id, quantity, price) lines to the rollups."""
+    _apply([(order.date, order.total)], [(order.date, *line) for line in lines])
+
+
+def remove_order(order):
+    """Subtracts an order that is about to be deleted from the rollups."""
+    lines = list(OrderItem.objects.filter(order=order).values_list('menuitem_id', 'menuitem__category_id',
+                                                                   'quantity', 'price'))
+    _apply([(order.date, order.total)], [(order.date, *line) for line in lines], sign=-1)
+    # drop what no longer has any sales, as a rebuild would
+    DailySales.objects.filter(date=order.date, orders=0).delete()
+    MenuItemSales.objects.filter(pk__in=[line[0] for line in lines], quantity=0).delete()
+    CategorySales.objects.filter(pk__in=[line[1] for line in lines], quantity=0).delete()
+
+
+def rebuild(batch_size=1000):
+    """
+    Recomputes every rollup from the order history, ``batch_size`` orders at
+    a time, in one transaction: concurrent checkouts wait for it instead of
+    being counted twice or not at all. Returns the number of orders read.
+    """
+    count = 0
+    with transaction.atomic(using=router.db_for_write(DailySales)):
+        for model in (DailySales, MenuItemSales, CategorySales):
+            model.objects.all().delete()
+        last_id = 0
+        while True:
+            ids = list(Order.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return count
+            batch = Order.objects.filter(pk__gte=ids[0], pk__lte=ids[-1])
+            lines = OrderItem.objects.filter(order_id__gte=ids[0], order_id__lte=ids[-1])
+            _add(DailySales, 'date', {
+                row['date']: {'orders': row['orders'], 'items': 0, 'revenue': row['revenue']}
+                for row in batch.values('date').annotate(orders=Count('pk'), revenue=Sum('total'))
+            })
+            _add(DailySales, 'date', {
+                row['order__date']: {'orders': 0, 'items': row['items'], 'revenue': Decimal(0)}
+                for row in lines.values('order__date').annotate(items=Sum('quantity'))
+            })
+            _add(MenuItemSales, 'menuitem', {
+                row['menuitem_id']: {'quantity': row['quantity'], 'revenue': row['revenue']}
+                for row in lines.values('menuitem_id').annotate(quantity=Sum('quantity'), revenue=Sum('price'))
+            })
+            _add(CategorySales, 'category', {
+                row['menuitem__category_id']: {'quantity': row['quantity'], 'revenue': row['revenue']}
+                for row in lines.values('menuitem__category_id').annotate(quantity=Sum('quantity'),
+                                                                           revenue=Sum('price'))
+            })
+            count += len(ids)
+            last_id = ids[-1]
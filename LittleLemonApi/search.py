@@ -0,0 +1,79 @@
+import re
+
+from django.db import connections
+from django.db.models import F, FloatField, Func, Lookup, Q, Value
+
+from .models import MenuItemSearch
+
+SEARCH_PARAM = 'search'
+# (title, category) weights of the bm25 ranking
+WEIGHTS = (10.0, 1.0)
+
+_WORD = re.compile(r'\w+')
+
+# (alias, database name) -> whether the FTS5 index exists there
+_available = {}
+
+
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+MenuItemSearch._meta.get_field('document').register_lookup(Match)
+
+
+class Rank(Func):
+    """bm25() of the joined FTS5 index; lower is more relevant."""
+    function = 'bm25'
+    output_field = FloatField()
+
+    def __init__(self):
+        super().__init__(F('search__document'), *[Value(weight) for weight in WEIGHTS])
+
+
+def words(text):
+    return _WORD.findall(text or '')
+
+
+def fts_query(text):
+    # every word as a quoted prefix ("chick" matches Chicken), all of them required
+    return ' '.join(f'"{word}"*' for word in words(text))
+
+
+def fts_available(using):
+    connection = connections[using]
+    key = (using, str(connection.settings_dict['NAME']))
+    if key not in _available:
+        _available[key] = connection.vendor == 'sqlite' and \
+            MenuItemSearch._meta.db_table in connection.introspection.table_names()
+    return _available[key]
+
+
+def full_text(queryset, text):
+    return queryset.filter(search__document__match=fts_query(text)).annotate(search_rank=Rank())
+
+
+def like_scan(queryset, text):
+    condition = Q()
+    for word in words(text):
+        condition &= Q(title__icontains=word) | Q(category__title__icontains=word)
+    return queryset.filter(condition).annotate(search_rank=Value(0.0))
+
+
+def search_menu_items(queryset, text):
+    """
+    Menu items whose title or category title contain a word starting with
+    each word of ``text``, annotated with ``search_rank`` (lower is more
+    relevant). Uses the FTS5 index; databases without it fall back to an
+    unranked LIKE scan for the words anywhere in the titles.
+    """
+    if not words(text):
+        return queryset.none().annotate(search_rank=Value(0.0))
+    if fts_available(queryset.db):
+        return full_text(queryset, text)
+    return like_scan(queryset, text)
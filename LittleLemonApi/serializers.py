@@ -1,21 +1,38 @@
 from django.contrib.auth.models import Group, User
+from django.conf import settings
 from rest_framework import serializers
-from .models import MenuItem, Cart, OrderItem, Order
+from .fastserializers import FastListSerializer
+from .instrumentation import segment
+from .models import Category, MenuItem, Cart, OrderItem, Order, DailySales, MenuItemSales, CategorySales, \
+    OrderEvent
 
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class InstrumentedModelSerializer(serializers.ModelSerializer):
+    # counts towards the 'serialize' segment of QueryInstrumentationMiddleware
+    def to_representation(self, instance):
+        with segment('serialize'):
+            return super().to_representation(instance)
+
+
+class CategorySerializer(InstrumentedModelSerializer):
+    class Meta:
+        model = Category
+        fields = '__all__'
+
+
+class MenuItemSerializer(InstrumentedModelSerializer):
     class Meta:
         model = MenuItem
         fields = '__all__'
 
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(InstrumentedModelSerializer):
     class Meta:
         model = Group
         fields = ['id', 'name']
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(InstrumentedModelSerializer):
     groups = GroupSerializer(many=True, read_only=True)
 
     class Meta:
@@ -23,19 +40,100 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'groups']
 
 
-class CartSerializer(serializers.ModelSerializer):
+class DeliveryCrewSerializer(InstrumentedModelSerializer):
+    # public profile of the crew member an order is assigned to
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name']
+
+
+class CartSerializer(InstrumentedModelSerializer):
     class Meta:
         model = Cart
         fields = '__all__'
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class CartBulkItemSerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField()
+    # 0 removes the item from the cart
+    quantity = serializers.IntegerField(min_value=0, max_value=32767)
+
+
+class CartBulkSerializer(serializers.Serializer):
+    items = CartBulkItemSerializer(many=True, allow_empty=False, max_length=100)
+
+    def validate_items(self, items):
+        menuitems = [item['menuitem'] for item in items]
+        if len(set(menuitems)) != len(menuitems):
+            raise serializers.ValidationError('Each menu item may only be listed once.')
+        return items
+
+
+class DailySalesSerializer(InstrumentedModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ['date', 'orders', 'items', 'revenue']
+
+
+class MenuItemSalesSerializer(InstrumentedModelSerializer):
+    title = serializers.CharField(source='menuitem.title')
+
+    class Meta:
+        model = MenuItemSales
+        fields = ['menuitem', 'title', 'quantity', 'revenue']
+
+
+class CategorySalesSerializer(InstrumentedModelSerializer):
+    title = serializers.CharField(source='category.title')
+
+    class Meta:
+        model = CategorySales
+        fields = ['category', 'title', 'quantity', 'revenue']
+
+
+class BatchItemSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'])
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+    headers = serializers.DictField(child=serializers.CharField(), required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchItemSerializer(many=True, allow_empty=False, max_length=settings.BATCH_MAX_REQUESTS)
+
+
+class OrderItemSerializer(InstrumentedModelSerializer):
     class Meta:
         model = OrderItem
         fields = '__all__'
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(InstrumentedModelSerializer):
     class Meta:
         model = Order
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class OrderDetailSerializer(InstrumentedModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'status', 'total', 'date', 'user', 'delivery_crew', 'items']
+
+
+class OrderEventSerializer(InstrumentedModelSerializer):
+    class Meta:
+        model = OrderEvent
+        fields = ['id', 'order', 'kind', 'status', 'delivery_crew', 'created']
+
+
+# read-only list fast paths producing the same output as the serializers above,
+# with the relations clients may expand (?expand=)
+ORDER_EXPANSIONS = {'items': OrderItemSerializer, 'delivery_crew': DeliveryCrewSerializer}
+
+fast_menu_items = FastListSerializer(MenuItemSerializer, {'category': CategorySerializer})
+fast_cart = FastListSerializer(CartSerializer)
+fast_orders = FastListSerializer(OrderSerializer, ORDER_EXPANSIONS)
+fast_order_details = FastListSerializer(OrderDetailSerializer, ORDER_EXPANSIONS)
+fast_order_events = FastListSerializer(OrderEventSerializer)
@@ -0,0 +1,37 @@
+import os
+import sqlite3
+import threading
+
+from django.conf import settings
+
+
+class SharedStore:
+    """
+    A small SQLite database next to the application, shared by every worker
+    process on the host. Used for state that must be exact across processes
+    (version markers, throttle counters, metrics) but does not belong in the main database.
+    Each thread of each process keeps its own connection.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self._local = threading.local()
+
+    def connection(self):
+        path = str(settings.SHARED_STORE_PATH)
+        conn = getattr(self._local, 'conn', None)
+        # reconnect after a fork or when the configured path changes (tests)
+        if conn is None or self._local.key != (os.getpid(), path):
+            conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # the data is cheap to lose, so trade durability for speed
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.executescript(self.schema)
+            self._local.conn = conn
+            self._local.key = (os.getpid(), path)
+        return conn
+
+    def reset(self, *tables):
+        conn = self.connection()
+        for table in tables:
+            conn.execute(f'DELETE FROM {table}')
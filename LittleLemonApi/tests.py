@@ -1,3 +1,1326 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.utils import load_backend
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date, parse_http_date
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import catalog, compression, export, metrics, profiling, roles, throttling, versions
+from .benchmarks import routes
+from .routers import PrimaryReplicaRouter, use_primary
+from .models import Cart, Category, CategorySales, DailySales, IdempotencyKey, MenuItem, MenuItemSales, Order, \
+    OrderEvent, OrderItem
+from .fastserializers import FastListSerializer
+from .renderers import FastJSONRenderer
+from .serializers import CartSerializer, CategorySerializer, MenuItemSerializer, OrderDetailSerializer, \
+    OrderSerializer, fast_cart, fast_menu_items, fast_order_details, fast_orders
+from .versions import auth_scope, bump_orders, bump_version, get_version, orders_scope
+from .views import CartViewSet
+
+
+def clear_caches():
+    # catalog payloads live in caches, version markers, throttle counters and metrics in the shared store
+    for cache in caches.all():
+        cache.clear()
+    versions.reset()
+    throttling.reset()
+    metrics.reset()
+
+
+def throttle_rates(**rates):
+    # e.g. throttle_rates(user=None) turns the per-user throttle off
+    rates = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates}
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+def make_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get_or_create(user=user)[0].key)
+    return client
+
+
+class IsolatedStorageMixin:
+    """Gives each test its own shared cache and shared store, in a temporary directory."""
+
+    def setUp(self):
+        super().setUp()
+        directory = self.enterContext(tempfile.TemporaryDirectory(prefix='littlelemon-test-'))
+        caches = {**settings.CACHES, 'shared': {**settings.CACHES['shared'], 'LOCATION': os.path.join(directory, 'cache')}}
+        self.enterContext(override_settings(CACHES=caches,
+                                            SHARED_STORE_PATH=os.path.join(directory, 'shared.sqlite3')))
+        clear_caches()
+
+
+class CheckoutMixin(IsolatedStorageMixin):
+    def setUp(self):
+        super().setUp()
+        Group.objects.get_or_create(name='Manager')
+        Group.objects.get_or_create(name='Delivery crew')
+        self.customer = User.objects.create_user('customer', password='secret')
+        self.category = Category.objects.create(slug='mains', title='Mains')
+
+    def fill_cart(self, items):
+        for i in range(items):
+            menuitem = MenuItem.objects.create(title=f'Dish {i}', price=Decimal('2.50'), featured=False,
+                                               category=self.category)
+            Cart.objects.create(user=self.customer, menuitem=menuitem, quantity=2,
+                                unit_price=Decimal('2.50'), price=Decimal('5.00'))
+
+
+class CheckoutTests(CheckoutMixin, TestCase):
+    def test_checkout_moves_cart_into_order(self):
+        self.fill_cart(3)
+        response = make_client(self.customer).post('/api/orders')
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(order.total, Decimal('15.00'))
+        self.assertEqual(OrderItem.objects.count(), 3)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_only_lock_contention_is_retryable(self):
+        self.fill_cart(1)
+        client = make_client(self.customer)
+        with mock.patch('LittleLemonApi.views.place_order', side_effect=OperationalError('database is locked')):
+            response = client.post('/api/orders')
+            self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+        with mock.patch('LittleLemonApi.views.place_order', side_effect=OperationalError('disk I/O error')):
+            with self.assertRaises(OperationalError):
+                client.post('/api/orders')
+
+    def test_totals_must_fit_the_order(self):
+        for i in range(2):
+            menuitem = MenuItem.objects.create(title=f'Dish {i}', price=Decimal('9999.00'), featured=False,
+                                               category=self.category)
+            Cart.objects.create(user=self.customer, menuitem=menuitem, quantity=1, unit_price=Decimal('9999.00'),
+                                price=Decimal('9999.00'))
+
+        response = make_client(self.customer).post('/api/orders')
+
+        self.assertEqual((response.status_code, response.data), (400, {'message': 'Order total too large'}))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.count(), 2)
+
+    def test_empty_cart_is_rejected(self):
+        response = make_client(self.customer).post('/api/orders')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        from .checkout import place_order
+
+        self.fill_cart(1)
+        with self.assertNumQueries(10):
+            place_order(self.customer)
+
+        OrderItem.objects.all().delete()
+        self.fill_cart(20)
+        with self.assertNumQueries(10):
+            place_order(self.customer)
+
+
+class ConcurrentCheckoutTests(CheckoutMixin, TransactionTestCase):
+    @throttle_rates(checkout=None)
+    def test_parallel_checkouts_place_a_single_order(self):
+        self.fill_cart(5)
+        clients = [make_client(self.customer) for _ in range(4)]
+        barrier = threading.Barrier(len(clients))
+        responses = []
+
+        def checkout(client):
+            barrier.wait()
+            try:
+                responses.append(client.post('/api/orders').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(responses.count(201), 1)
+        self.assertTrue(set(responses) <= {201, 400, 409})
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 5)
+        self.assertFalse(Cart.objects.exists())
+
+    @throttle_rates(checkout=None)
+    def test_checkouts_of_different_customers_wait_for_each_other(self):
+        menuitem = MenuItem.objects.create(title='Dish', price=Decimal('2.50'), featured=False,
+                                           category=self.category)
+        customers = [User.objects.create_user(f'customer{i}', password='secret') for i in range(6)]
+        for customer in customers:
+            Cart.objects.create(user=customer, menuitem=menuitem, quantity=2, unit_price=Decimal('2.50'),
+                                price=Decimal('5.00'))
+        clients = [make_client(customer) for customer in customers]
+        barrier = threading.Barrier(len(clients))
+        responses = []
+
+        def checkout(client):
+            barrier.wait()
+            try:
+                responses.append(client.post('/api/orders').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(responses, [201] * len(customers))
+        self.assertEqual(sorted(Order.objects.values_list('user_id', flat=True)),
+                         sorted(customer.pk for customer in customers))
+        self.assertFalse(Cart.objects.exists())
+
+
+class VersionMarkerTests(IsolatedStorageMixin, SimpleTestCase):
+    def test_markers_are_created_once_and_only_move_forward(self):
+        version = get_version('scope')
+        self.assertEqual(get_version('scope'), version)
+
+        with mock.patch.object(versions, '_now', return_value=version):
+            bumped = [bump_version('scope') for _ in range(3)]
+        self.assertEqual(bumped, [version + 1, version + 2, version + 3])
+        self.assertEqual(get_version('scope'), version + 3)
+
+    def test_culling_the_shared_cache_keeps_the_markers(self):
+        version = bump_version(auth_scope(1))
+        caches['shared'].clear()
+
+        self.assertEqual(get_version(auth_scope(1)), version)
+
+
+class SlidingWindowThrottleTests(IsolatedStorageMixin, SimpleTestCase):
+    def test_limit_within_a_window(self):
+        self.assertEqual([throttling.hit('key', 3, 60, 120 + i) for i in range(3)], [(True, None)] * 3)
+        # the window ends at 180
+        self.assertEqual(throttling.hit('key', 3, 60, 130), (False, 50))
+        self.assertEqual(throttling.hit('other', 3, 60, 130), (True, None))
+
+    def test_previous_window_slides_out(self):
+        for i in range(3):
+            throttling.hit('key', 3, 60, 120 + i)
+
+        # right after the rollover the whole previous window still counts...
+        allowed, wait = throttling.hit('key', 3, 60, 180)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 20)
+        # ...and a third of it has slid out 20 seconds later
+        self.assertEqual(throttling.hit('key', 3, 60, 200), (True, None))
+        self.assertEqual(throttling.hit('key', 3, 60, 200)[0], False)
+        # two windows later nothing is left
+        self.assertEqual([throttling.hit('key', 3, 60, 300 + i)[0] for i in range(4)], [True, True, True, False])
+
+
+class ThrottledRequestTests(CheckoutMixin, TestCase):
+    @throttle_rates(user='2/minute')
+    def test_throttled_requests_get_retry_after(self):
+        client = make_client(self.customer)
+        statuses = [client.get('/api/orders').status_code for _ in range(3)]
+        response = client.get('/api/orders')
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 60)
+
+
+class CatalogCacheTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = MenuItem.objects.create(title='Dish', price=Decimal('2.50'), featured=False,
+                                            category=self.category)
+        self.client = make_client(self.customer)
+
+    def menu(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/menu-items')
+        return response.data, [query['sql'] for query in queries if 'menuitem' in query['sql']]
+
+    def test_menu_pages_are_served_from_the_cache(self):
+        first, first_queries = self.menu()
+        second, second_queries = self.menu()
+
+        self.assertEqual(first, second)
+        self.assertTrue(first_queries)
+        self.assertEqual(second_queries, [])
+
+    def test_writes_invalidate_once_committed(self):
+        self.menu()
+        version = get_version(catalog.CATALOG)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.item.price = Decimal('3.00')
+                self.item.save()
+                self.assertEqual(get_version(catalog.CATALOG), version)
+
+        self.assertNotEqual(get_version(catalog.CATALOG), version)
+        self.assertEqual(self.menu()[0][0]['price'], '3.00')
+
+    def test_queryset_writes_invalidate(self):
+        self.menu()
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.filter(pk=self.item.pk).update(price=Decimal('4.00'))
+        self.assertEqual(self.menu()[0][0]['price'], '4.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.bulk_create([MenuItem(title='New', price=Decimal('1.00'), featured=False,
+                                                   category=self.category)])
+        self.assertEqual(len(self.menu()[0]), 2)
+
+
+@throttle_rates(user=None)
+class ConditionalGetTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.fill_cart(1)
+        self.client = make_client(self.customer)
+        self.assertEqual(self.client.post('/api/orders').status_code, 201)
+
+    def get(self, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/orders', **headers)
+        return response, [query['sql'] for query in queries if '"LittleLemonApi_order"' in query['sql']]
+
+    def test_matching_etag_is_not_modified(self):
+        response, _ = self.get()
+        etag = response['ETag']
+
+        not_modified, queries = self.get(HTTP_IF_NONE_MATCH=etag)
+        weak, _ = self.get(HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((not_modified.status_code, not_modified['ETag'], not_modified.content), (304, etag, b''))
+        self.assertEqual(queries, [])
+        self.assertEqual(weak.status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"')[0].status_code, 200)
+
+    def test_if_modified_since(self):
+        response, _ = self.get()
+        last_modified = parse_http_date(response['Last-Modified'])
+
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])[0].status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(last_modified - 60))[0].status_code, 200)
+        # If-None-Match takes precedence
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                                  HTTP_IF_NONE_MATCH='"other"')[0].status_code, 200)
+
+    def test_changes_produce_a_new_etag(self):
+        etag = self.get()[0]['ETag']
+        bump_orders(self.customer.pk)
+
+        response, queries = self.get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertTrue(queries)
+        # other customers' orders do not change this customer's tag
+        bump_version(orders_scope(self.customer.pk + 1))
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag'])[0].status_code, 304)
+
+
+class OrderDetailTests(CheckoutMixin, TestCase):
+    def test_order_detail_only_returns_its_own_items(self):
+        client = make_client(self.customer)
+        self.fill_cart(2)
+        first = client.post('/api/orders').data['order']
+        self.fill_cart(1)
+        second = client.post('/api/orders').data['order']
+
+        # the order and its items; credentials and roles are cached by now
+        with self.assertNumQueries(2):
+            response = client.get(f'/api/orders/{second}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], second)
+        self.assertEqual([item['order'] for item in response.data['items']], [second])
+        self.assertEqual(len(client.get(f'/api/orders/{first}').data['items']), 2)
+
+
+@throttle_rates(user=None)
+class OrderListingTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = User.objects.create_user('manager', password='secret')
+        self.manager.groups.add(Group.objects.get(name='Manager'))
+        self.crew = User.objects.create_user('crew', password='secret')
+        self.crew.groups.add(Group.objects.get(name='Delivery crew'))
+        other = User.objects.create_user('other', password='secret')
+        self.orders = [
+            Order.objects.create(user=self.customer, delivery_crew=self.crew, status=True, total=Decimal('12.00'),
+                                 date='2023-01-01'),
+            Order.objects.create(user=self.customer, delivery_crew=None, status=False, total=Decimal('7.50'),
+                                 date='2023-01-02'),
+            Order.objects.create(user=other, delivery_crew=self.crew, status=False, total=Decimal('30.00'),
+                                 date='2023-01-03'),
+            Order.objects.create(user=other, delivery_crew=self.crew, status=False, total=Decimal('4.00'),
+                                 date='2023-01-03'),
+        ]
+
+    def ids(self, user, query=''):
+        response = make_client(user).get('/api/orders' + query)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_filters(self):
+        first, second, third, fourth = (order.pk for order in self.orders)
+
+        # newest first, ties broken by id in the same direction
+        self.assertEqual(self.ids(self.manager), [fourth, third, second, first])
+        self.assertEqual(self.ids(self.manager, '?status=true'), [first])
+        self.assertEqual(self.ids(self.manager, '?status=false&date_from=2023-01-02&date_to=2023-01-02'), [second])
+        self.assertEqual(self.ids(self.manager, f'?user={self.customer.pk}&ordering=total'), [second, first])
+        self.assertEqual(self.ids(self.manager, f'?delivery_crew={self.crew.pk}&ordering=-total'),
+                         [third, first, fourth])
+
+    def test_delivery_crew_only_see_their_orders(self):
+        first, _, third, fourth = (order.pk for order in self.orders)
+
+        self.assertEqual(self.ids(self.crew), [fourth, third, first])
+        self.assertEqual(self.ids(self.crew, '?status=0'), [fourth, third])
+        self.assertEqual(self.ids(self.crew, f'?user={self.customer.pk}'), [first])
+
+    def test_pages_follow_the_next_links(self):
+        client = make_client(self.manager)
+        pages = [client.get('/api/orders?ordering=date&perpage=3').data]
+        pages.append(client.get(pages[0]['next']).data)
+
+        self.assertEqual([[row['id'] for row in page['results']] for page in pages],
+                         [[order.pk for order in self.orders[:3]], [self.orders[3].pk]])
+        self.assertIsNone(pages[0]['previous'])
+        self.assertIsNone(pages[1]['next'])
+        self.assertEqual(client.get(pages[1]['previous']).data['results'], pages[0]['results'])
+
+    def test_invalid_filters_are_rejected(self):
+        client = make_client(self.manager)
+        for query, field in [('status=maybe', 'status'), ('date_from=2023-13-01', 'date_from'),
+                             ('date_to=yesterday', 'date_to'), ('delivery_crew=me', 'delivery_crew'),
+                             ('user=-1', 'user'), ('ordering=secret', 'ordering')]:
+            response = client.get('/api/orders?' + query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn(field, response.data)
+
+
+@throttle_rates(user=None)
+class OrderExportTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = User.objects.create_user('manager', password='secret')
+        self.manager.groups.add(Group.objects.get(name='Manager'))
+        dish = MenuItem.objects.create(title='Dish', price=Decimal('2.50'), featured=False, category=self.category)
+        side = MenuItem.objects.create(title='Side', price=Decimal('1.00'), featured=False, category=self.category)
+        self.orders = [
+            Order.objects.create(user=self.customer, status=True, total=Decimal('6.00'), date='2023-01-01'),
+            Order.objects.create(user=self.customer, status=False, total=Decimal('0.00'), date='2023-01-02'),
+            Order.objects.create(user=self.customer, status=False, total=Decimal('2.50'), date='2023-01-03'),
+        ]
+        OrderItem.objects.create(order=self.orders[0], menuitem=dish, quantity=2, unit_price=Decimal('2.50'),
+                                 price=Decimal('5.00'))
+        OrderItem.objects.create(order=self.orders[0], menuitem=side, quantity=1, unit_price=Decimal('1.00'),
+                                 price=Decimal('1.00'))
+        OrderItem.objects.create(order=self.orders[2], menuitem=dish, quantity=1, unit_price=Decimal('2.50'),
+                                 price=Decimal('2.50'))
+
+    def export(self, query=''):
+        response = make_client(self.manager).get('/api/orders/export' + query)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_nests_the_items(self):
+        response, body = self.export()
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        orders = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([order['id'] for order in orders], [order.pk for order in self.orders])
+        self.assertEqual(orders[0]['total'], '6.00')
+        self.assertEqual(orders[0]['date'], '2023-01-01')
+        self.assertEqual([(item['quantity'], item['price']) for item in orders[0]['items']],
+                         [(2, '5.00'), (1, '1.00')])
+        self.assertEqual(orders[1]['items'], [])
+
+    def test_csv_has_a_row_per_item(self):
+        response, body = self.export('?output=csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders.csv"')
+        rows = body.splitlines()
+        self.assertEqual(rows[0].split(','), export.CSV_HEADER)
+        # two items, an order without items and one item
+        self.assertEqual([int(row.split(',')[0]) for row in rows[1:]],
+                         [self.orders[0].pk, self.orders[0].pk, self.orders[1].pk, self.orders[2].pk])
+        self.assertTrue(rows[2].endswith(',1,1.00,1.00'))
+
+    def test_empty_exports(self):
+        _, body = self.export('?output=csv&date_from=2024-01-01')
+        self.assertEqual(body.splitlines(), [','.join(export.CSV_HEADER)])
+        _, body = self.export(f'?after_id={self.orders[-1].pk}')
+        self.assertEqual(body, '')
+
+    def test_filters_and_resuming(self):
+        _, body = self.export(f'?status=false&after_id={self.orders[1].pk}')
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], [self.orders[2].pk])
+
+        client = make_client(self.manager)
+        for query in ['?output=xml', '?after_id=last', '?date_from=never']:
+            self.assertEqual(client.get('/api/orders/export' + query).status_code, 400, query)
+        self.assertEqual(make_client(self.customer).get('/api/orders/export').status_code, 403)
+
+    def test_chunks_are_read_one_query_pair_at_a_time(self):
+        chunks = export.iter_order_chunks(chunk_size=2)
+        # the orders of a chunk, then their items
+        with self.assertNumQueries(2):
+            self.assertEqual([order['id'] for order, _ in next(chunks)], [order.pk for order in self.orders[:2]])
+        with self.assertNumQueries(2):
+            self.assertEqual([order['id'] for order, _ in next(chunks)], [self.orders[2].pk])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(chunks), [])
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('export_orders', '--date-from', '2023-01-02', '--chunk-size', '1', stdout=out)
+        self.assertEqual([json.loads(line)['id'] for line in out.getvalue().splitlines()],
+                         [order.pk for order in self.orders[1:]])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'orders.csv')
+            call_command('export_orders', '--format', 'csv', '--after-id', str(self.orders[0].pk), '--output', path)
+            with open(path, newline='') as f:
+                self.assertEqual(len(f.read().splitlines()), 3)
+
+        with self.assertRaisesMessage(CommandError, 'status: Must be true or false.'):
+            call_command('export_orders', '--status', 'maybe')
+
+
+class CachedTokenAuthenticationTests(IsolatedStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('customer', password='secret')
+        self.client = make_client(self.user)
+
+    def count_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return len(queries)
+
+    def test_cached_credentials_save_a_query_per_request(self):
+        first = self.count_queries('/api/cart/menu-items')
+        second = self.count_queries('/api/cart/menu-items?page=2')
+
+        # token+user lookup and role lookup on the first request, neither afterwards
+        self.assertEqual(first - second, 2)
+
+    def test_logout_revokes_cached_token(self):
+        self.count_queries('/api/cart/menu-items')
+        self.assertEqual(self.client.post('/auth/token/logout/').status_code, 204)
+
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+
+    def test_deactivation_revokes_cached_token(self):
+        self.count_queries('/api/cart/menu-items')
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+
+
+@throttle_rates(user=None)
+class RoleCacheTests(IsolatedStorageMixin, TestCase):
+    managers = '/api/groups/manager/users'
+
+    def setUp(self):
+        super().setUp()
+        self.group = Group.objects.create(name='Manager')
+        self.user = User.objects.create_user('customer', password='secret')
+        self.client = make_client(self.user)
+        # cache the user's credentials and (lack of) roles
+        self.assertEqual(self.client.get(self.managers).status_code, 403)
+
+    def join_silently(self):
+        # a membership change no signal reports, as another process's change looks to this one
+        User.groups.through.objects.create(user=self.user, group=self.group)
+
+    def test_membership_changes_take_effect_on_the_next_request(self):
+        self.user.groups.add(self.group)
+        self.assertEqual(self.client.get(self.managers).status_code, 200)
+        self.group.user_set.remove(self.user)
+        self.assertEqual(self.client.get(self.managers).status_code, 403)
+        self.group.user_set.add(self.user)
+        self.assertEqual(self.client.get(self.managers).status_code, 200)
+        self.group.user_set.clear()
+        self.assertEqual(self.client.get(self.managers).status_code, 403)
+
+    def test_renaming_or_deleting_a_group_invalidates_its_members(self):
+        self.user.groups.add(self.group)
+        self.assertEqual(self.client.get(self.managers).status_code, 200)
+        self.group.name = 'Managers'
+        self.group.save()
+        self.assertEqual(self.client.get(self.managers).status_code, 403)
+
+        self.group.name = 'Manager'
+        self.group.save()
+        self.assertEqual(self.client.get(self.managers).status_code, 200)
+        self.group.delete()
+        self.assertEqual(self.client.get(self.managers).status_code, 403)
+
+    def test_entries_of_an_older_auth_version_are_reloaded(self):
+        self.join_silently()
+        # still cached, as the TTL allows
+        self.assertEqual(self.client.get(self.managers).status_code, 403)
+
+        bump_version(auth_scope(self.user.pk))
+        self.assertEqual(self.client.get(self.managers).status_code, 200)
+
+    def test_saving_the_user_invalidates_their_roles(self):
+        self.join_silently()
+        self.user.first_name = 'Ana'
+        self.user.save()
+
+        self.assertEqual(self.client.get(self.managers).status_code, 200)
+
+    def test_deleting_a_token_invalidates_the_roles(self):
+        self.join_silently()
+        Token.objects.get(user=self.user).delete()
+
+        self.assertEqual(self.client.get(self.managers).status_code, 401)
+        self.assertEqual(make_client(self.user).get(self.managers).status_code, 200)
+        self.assertEqual(roles.get_roles(mock.Mock(user=self.user, spec=['user'])), frozenset(['Manager']))
+
+
+@override_settings(SQL_INSTRUMENTATION=True, SLOW_REQUEST_THRESHOLD_MS=0)
+class QueryInstrumentationTests(CheckoutMixin, TestCase):
+    def test_server_timing_and_slow_request_log(self):
+        self.fill_cart(2)
+        client = make_client(self.customer)
+
+        with self.assertLogs('LittleLemonApi.slow_requests', 'WARNING') as logs:
+            response = client.get('/api/cart/menu-items')
+
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        for name in ('db;', 'auth;', 'serialize;', 'total;'):
+            self.assertIn(name, timing)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['path'], '/api/cart/menu-items')
+        self.assertEqual(entry['query_count'], len(entry['statements']))
+        self.assertIn(f'"{entry["query_count"]} queries', timing)
+
+
+class MetricsTests(CheckoutMixin, TestCase):
+    def test_metrics_aggregate_routes_statuses_and_checkouts(self):
+        self.fill_cart(1)
+        client = make_client(self.customer)
+        self.assertEqual(client.post('/api/orders').status_code, 201)
+        self.assertEqual(client.post('/api/orders').status_code, 400)
+
+        body = client.get('/metrics').content.decode()
+
+        self.assertIn('littlelemon_requests_total{route="api/orders",method="POST",status="201"} 1', body)
+        self.assertIn('littlelemon_requests_total{route="api/orders",method="POST",status="400"} 1', body)
+        self.assertIn('littlelemon_request_duration_seconds_count{route="api/orders",method="POST"} 2', body)
+        self.assertIn('littlelemon_request_queries_bucket{route="api/orders",method="POST",le="+Inf"} 2', body)
+        self.assertIn('littlelemon_checkout_duration_seconds_count{outcome="created"} 1', body)
+        self.assertIn('littlelemon_checkout_duration_seconds_count{outcome="empty"} 1', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        self.assertEqual(APIClient().get('/metrics').status_code, 403)
+        self.assertEqual(APIClient().get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class ProfilingTests(CheckoutMixin, TestCase):
+    def test_header_profiles_staff_requests_only(self):
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        with tempfile.TemporaryDirectory() as profile_dir, \
+                self.settings(PROFILING=True, PROFILE_SAMPLE_RATE=0, PROFILE_DIR=profile_dir):
+            profiling.reset()
+            with mock.patch.object(profiling.cProfile, 'Profile', wraps=profiling.cProfile.Profile) as profile:
+                make_client(self.customer).get('/api/cart/menu-items', HTTP_X_PROFILE='1')
+                self.client.get('/api/menu-items', HTTP_X_PROFILE='1')
+                self.client.get('/api/menu-items', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Token bad')
+                # nobody but staff gets to run the profiler
+                self.assertEqual(profile.call_count, 0)
+                self.assertEqual(os.listdir(profile_dir), [])
+
+                make_client(staff).get('/api/cart/menu-items', HTTP_X_PROFILE='1')
+                make_client(staff).get('/api/cart/menu-items', HTTP_X_PROFILE='1')
+                self.assertEqual(profile.call_count, 2)
+            out = StringIO()
+            call_command('profile_summary', limit=5, stdout=out)
+            profiling.reset()
+
+        self.assertIn('== api/cart/menu-items: 2 requests', out.getvalue())
+
+
+class FastListSerializerTests(CheckoutMixin, TestCase):
+    def test_output_matches_serializers_byte_for_byte(self):
+        crew = User.objects.create_user('crew', password='secret')
+        other = User.objects.create_user('other', password='secret')
+        self.fill_cart(3)
+        MenuItem.objects.create(title='Soup "du jour" \u00e9', price=Decimal('10.5'), featured=True,
+                                category=self.category)
+        for user in (self.customer, other):
+            Order.objects.create(user=user, total=Decimal('0.1'), date='2023-07-01')
+        order = Order.objects.create(user=self.customer, delivery_crew=crew, status=True, total=Decimal('12'),
+                                     date='2023-07-02')
+        for menuitem in MenuItem.objects.all()[:3]:
+            OrderItem.objects.create(order=order, menuitem=menuitem, quantity=2, unit_price=Decimal('2.5'),
+                                     price=Decimal('5'))
+
+        renderer = JSONRenderer()
+        for serializer_class, fast, queryset in [
+            (MenuItemSerializer, fast_menu_items, MenuItem.objects.order_by('id')),
+            (CartSerializer, fast_cart, Cart.objects.filter(user=self.customer)),
+            (OrderSerializer, fast_orders, Order.objects.order_by('-date', 'id')),
+            (OrderDetailSerializer, fast_order_details, Order.objects.filter(user=self.customer)),
+        ]:
+            with self.subTest(serializer_class.__name__):
+                expected = renderer.render(serializer_class(queryset, many=True).data)
+                self.assertEqual(renderer.render(fast.list(queryset)), expected)
+
+
+class RenderingTests(CheckoutMixin, TestCase):
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {
+            'price': Decimal('1.50'), 'date': date(2023, 7, 1),
+            'created': datetime(2023, 7, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+            'title': 'Cr\u00e8me br\u00fbl\u00e9e', 'items': [{'id': 1, 'featured': True, 'crew': None}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_large_responses_are_gzipped(self):
+        self.fill_cart(30)
+        client = make_client(self.customer)
+
+        plain = client.get('/api/cart/menu-items')
+        compressed = client.get('/api/cart/menu-items', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        small = make_client(self.customer).get('/api/orders', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertNotIn('Content-Encoding', small)
+
+    @skipUnless(compression.brotli, 'brotli is not installed')
+    def test_brotli_is_preferred_when_accepted(self):
+        self.fill_cart(30)
+        client = make_client(self.customer)
+
+        plain = client.get('/api/cart/menu-items')
+        compressed = client.get('/api/cart/menu-items', HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(compressed['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(compressed.content), plain.content)
+
+
+class SparseFieldsetTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = User.objects.create_user('manager', password='secret')
+        self.manager.groups.add(Group.objects.get(name='Manager'))
+        self.crew = User.objects.create_user('crew', password='secret', first_name='Ana')
+        self.fill_cart(2)
+
+    def test_menu_items_fields_and_category_expansion(self):
+        client = make_client(self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/menu-items?fields=id,title&expand=category&perpage=5')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0], {
+            'id': response.data[0]['id'], 'title': 'Dish 0',
+            'category': {'id': self.category.id, 'slug': 'mains', 'title': 'Mains'},
+        })
+        # the page query (the other one is the paginator's count)
+        sql = [query['sql'] for query in queries if 'menuitem' in query['sql'] and 'COUNT' not in query['sql']]
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn('"price"', sql[0])
+        self.assertIn('JOIN', sql[0])
+
+    def test_orders_expansion_with_keyset_pagination(self):
+        client = make_client(self.customer)
+        self.assertEqual(client.post('/api/orders').status_code, 201)
+        Order.objects.create(user=self.customer, delivery_crew=self.crew, total=Decimal('1'), date='2023-01-01')
+
+        response = make_client(self.manager).get('/api/orders?fields=total&expand=delivery_crew,items&perpage=1')
+        second = make_client(self.manager).get(response.data['next'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['delivery_crew'], None)
+        self.assertEqual(list(response.data['results'][0]), ['total', 'delivery_crew', 'items'])
+        self.assertEqual(len(response.data['results'][0]['items']), 2)
+        self.assertEqual(second.data['results'], [{
+            'total': '1.00', 'items': [],
+            'delivery_crew': {'id': self.crew.id, 'username': 'crew', 'first_name': 'Ana', 'last_name': ''},
+        }])
+
+    def test_variants_are_shared_by_equivalent_fieldsets(self):
+        fast = FastListSerializer(MenuItemSerializer, {'category': CategorySerializer})
+        variant = fast.variant(['id', 'title'])
+
+        self.assertIs(fast.variant(['title', 'id', 'id']), variant)
+        self.assertIs(fast.variant(['id', 'title'], ['category', 'category']),
+                      fast.variant(['title', 'id'], ['category']))
+        self.assertEqual(len(fast._variants), 2)
+        self.assertEqual(list(variant.list(MenuItem.objects.all())[0]), ['id', 'title'])
+
+    def test_unknown_fields_are_rejected(self):
+        client = make_client(self.customer)
+        self.assertEqual(client.get('/api/menu-items?fields=secret').status_code, 400)
+        self.assertEqual(client.get('/api/orders?expand=user').status_code, 400)
+
+
+class KeysetPaginationTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.items = [MenuItem.objects.create(title=f'Dish {i}', price=Decimal(price), featured=False,
+                                              category=self.category)
+                      for i, price in enumerate(['3.00', '1.00', '2.00', '1.00', '5.00'])]
+        self.client = make_client(self.customer)
+
+    def test_pages_walk_the_ordering_both_ways(self):
+        url = '/api/menu-items?pagination=cursor&ordering=price&perpage=2&with_count=1'
+        pages = [self.client.get(url).data]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).data)
+
+        expected = sorted(self.items, key=lambda item: (item.price, item.pk))
+        self.assertEqual([[row['id'] for row in page['results']] for page in pages],
+                         [[item.pk for item in expected[i:i + 2]] for i in (0, 2, 4)])
+        self.assertEqual({page['count'] for page in pages}, {5})
+        self.assertIsNone(pages[0]['previous'])
+        self.assertEqual(self.client.get(pages[1]['previous']).data['results'], pages[0]['results'])
+
+    def test_invalid_cursors_are_rejected(self):
+        def cursor(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+        for token in ['not-a-cursor', cursor({'o': ['price', 'id'], 'v': ['abc', 1], 'r': False}),
+                      cursor({'o': ['price', 'id'], 'v': ['1.00', 'x'], 'r': False}),
+                      cursor({'o': ['title', 'id'], 'v': ['Dish 0', 1], 'r': False})]:
+            response = self.client.get(f'/api/menu-items?ordering=price&cursor={token}')
+            self.assertEqual((response.status_code, response.json()), (400, {'cursor': 'Invalid cursor.'}))
+
+        token = cursor({'o': ['price', 'id'], 'v': ['1.00', self.items[1].pk], 'r': False})
+        response = self.client.get(f'/api/menu-items?ordering=price&cursor={token}&perpage=1')
+        self.assertEqual([row['id'] for row in response.data['results']], [self.items[3].pk])
+
+
+class BulkCartTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.items = [MenuItem.objects.create(title=f'Dish {i}', price=Decimal('2.50'), featured=False,
+                                              category=self.category) for i in range(20)]
+        self.client = make_client(self.customer)
+        self.client.get('/api/cart/menu-items')  # warm the credential cache
+
+    def bulk(self, quantities):
+        items = [{'menuitem': item.pk, 'quantity': quantity} for item, quantity in quantities]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/cart/menu-items/bulk', {'items': items}, format='json')
+        return response, len(queries)
+
+    def test_query_count_does_not_depend_on_item_count(self):
+        _, one = self.bulk([(self.items[0], 1)])
+        response, twenty = self.bulk([(item, 2) for item in self.items])
+
+        self.assertEqual(one, twenty)
+        self.assertEqual(len(response.data), 20)
+        self.assertEqual(response.data[0]['price'], '5.00')
+
+    def test_upsert_uses_menu_prices_and_zero_removes(self):
+        self.bulk([(self.items[0], 1), (self.items[1], 1)])
+        self.items[0].price = Decimal('4.00')
+        self.items[0].save()
+
+        response, _ = self.bulk([(self.items[0], 3), (self.items[1], 0)])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['menuitem'], row['quantity'], row['unit_price'], row['price']) for row in response.data],
+                         [(self.items[0].pk, 3, '4.00', '12.00')])
+
+    def test_invalid_payloads_are_rejected(self):
+        self.assertEqual(self.bulk([(self.items[0], 1), (self.items[0], 2)])[0].status_code, 400)
+        self.assertEqual(self.bulk([(self.items[0], -1)])[0].status_code, 400)
+        response = self.client.post('/api/cart/menu-items/bulk', {'items': [{'menuitem': 0, 'quantity': 1}]},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_line_prices_must_fit_the_cart(self):
+        self.items[1].price = Decimal('50.00')
+        self.items[1].save()
+
+        response, _ = self.bulk([(self.items[0], 3999), (self.items[1], 30000)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'items': [f'Quantity too large for menu items: {[self.items[1].pk]}.']})
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.bulk([(self.items[0], 3999)])[0].data[0]['price'], '9997.50')
+
+    def test_clearing_is_a_single_delete(self):
+        self.bulk([(item, 1) for item in self.items])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.delete('/api/cart/menu-items').status_code, 200)
+
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['DELETE'])
+        self.assertFalse(Cart.objects.exists())
+
+
+class IdempotencyKeyTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = make_client(self.customer)
+
+    def test_retried_checkout_replays_the_first_response(self):
+        self.fill_cart(2)
+        first = self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.fill_cart(1)
+        retry = self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_reusing_a_key_for_another_request_is_rejected(self):
+        item = MenuItem.objects.create(title='Soup', price=Decimal('3.00'), featured=False, category=self.category)
+        payload = {'items': [{'menuitem': item.pk, 'quantity': 1}]}
+        self.client.post('/api/cart/menu-items/bulk', payload, format='json', HTTP_IDEMPOTENCY_KEY='k')
+        payload['items'][0]['quantity'] = 2
+
+        response = self.client.post('/api/cart/menu-items/bulk', payload, format='json', HTTP_IDEMPOTENCY_KEY='k')
+
+        self.assertEqual(response.status_code, 422)
+
+    def test_in_flight_duplicates_are_rejected_until_abandoned(self):
+        self.fill_cart(1)
+        self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='k')
+        row = IdempotencyKey.objects.get()
+        row.status_code = None
+        row.save()
+
+        response = self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='k')
+        self.assertEqual((response.status_code, response['Retry-After']), (409, '1'))
+
+        row.created -= timedelta(minutes=5)
+        row.save()
+        self.fill_cart(1)
+        self.assertEqual(self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='k').status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_expired_keys_are_purged(self):
+        self.fill_cart(1)
+        self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='old')
+        IdempotencyKey.objects.update(created=F('created') - timedelta(days=2))
+        self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='new')
+
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+
+        self.assertIn('Purged 1 ', out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class BatchTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.fill_cart(2)
+        self.client = make_client(self.customer)
+
+    def batch(self, *requests):
+        response = self.client.post('/api/batch', {'requests': [
+            dict(zip(('method', 'path', 'body'), request)) for request in requests
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['responses']
+
+    def test_results_match_individual_requests(self):
+        results = self.batch(('GET', '/api/menu-items'), ('GET', '/api/cart/menu-items'), ('GET', '/api/orders'))
+
+        self.assertEqual([result['status'] for result in results], [200, 200, 200])
+        for path, result in zip(('/api/menu-items', '/api/cart/menu-items', '/api/orders'), results):
+            self.assertEqual(result['body'], self.client.get(path).json())
+
+    def test_writes_see_earlier_sub_requests_and_keep_permission_checks(self):
+        menuitem = MenuItem.objects.first()
+        results = self.batch(
+            ('DELETE', '/api/cart/menu-items'),
+            ('POST', '/api/cart/menu-items/bulk', {'items': [{'menuitem': menuitem.pk, 'quantity': 3}]}),
+            ('GET', '/api/cart/menu-items'),
+            ('POST', '/api/menu-items', {'title': 'Pie', 'price': '4.00', 'featured': False, 'category': 1}),
+        )
+
+        self.assertEqual([result['status'] for result in results], [200, 200, 200, 403])
+        self.assertEqual([item['menuitem'] for item in results[2]['body']], [menuitem.pk])
+        self.assertFalse(MenuItem.objects.filter(title='Pie').exists())
+
+    def test_sub_requests_are_throttled_individually(self):
+        results = self.batch(*[('GET', '/api/cart/menu-items')] * 6)
+
+        self.assertEqual([result['status'] for result in results], [200] * 5 + [429])
+        self.assertIn('Retry-After', results[5]['headers'])
+
+    def test_unknown_paths_and_nested_batches_are_rejected(self):
+        results = self.batch(('GET', '/api/nothing-here'), ('GET', '/admin/'), ('POST', '/api/batch', {'requests': []}))
+
+        self.assertEqual([result['status'] for result in results], [404, 404, 400])
+
+
+class ConcurrentBatchTests(CheckoutMixin, TransactionTestCase):
+    def test_independent_reads_run_concurrently(self):
+        self.fill_cart(2)
+        client = make_client(self.customer)
+        threads = set()
+        view = CartViewSet.list
+
+        def list_cart(viewset, request, *args, **kwargs):
+            threads.add(threading.get_ident())
+            return view(viewset, request, *args, **kwargs)
+
+        with mock.patch.object(CartViewSet, 'list', list_cart):
+            response = client.post('/api/batch', {'requests': [
+                {'method': 'GET', 'path': '/api/cart/menu-items'} for _ in range(4)
+            ]}, format='json')
+
+        self.assertEqual([result['status'] for result in response.json()['responses']], [200] * 4)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+class SQLiteProductionProfileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+        settings_dict = {**connection.settings_dict, **settings.SQLITE_PRODUCTION_PROFILE, 'NAME': self.path}
+        self.connection = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, 'profile')
+        connections['profile'] = self.connection
+        self.addCleanup(connections.__delitem__, 'profile')
+        self.addCleanup(self.connection.close)
+
+    def test_new_connections_run_the_pragmas(self):
+        with self.connection.cursor() as cursor:
+            pragmas = [cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                       for name in ('journal_mode', 'synchronous', 'cache_size')]
+        self.assertEqual(pragmas, ['wal', 1, -65536])
+
+    def test_transactions_take_the_write_lock_when_they_start(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (id integer)')
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+
+        with transaction.atomic(using='profile'):
+            self.connection.cursor().execute('SELECT count(*) FROM t')
+            with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+                other.execute('BEGIN IMMEDIATE')
+
+
+class RouteBenchmarkTests(SimpleTestCase):
+    def test_exceptions_count_as_errors(self):
+        def prepare(data, i):
+            raise ValueError(f'cannot prepare request {i % 2}')
+
+        result = routes.run_route(routes.Route('broken', 'GET', 'anonymous', prepare), None, 4, 2)
+
+        self.assertEqual((result['requests'], result['errors']), (0, 4))
+        self.assertEqual(result['exceptions'], {'ValueError: cannot prepare request 0': 2,
+                                                'ValueError: cannot prepare request 1': 2})
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def test_catalog_and_order_reads_go_to_a_replica(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual([router.db_for_read(model) for model in (MenuItem, Order, User, IdempotencyKey)],
+                         ['replica1', 'replica1', None, None])
+        self.assertEqual(router.db_for_write(MenuItem), 'default')
+        with use_primary():
+            self.assertIsNone(router.db_for_read(MenuItem))
+
+
+class ReadYourWritesTests(CheckoutMixin, TransactionTestCase):
+    @contextmanager
+    def routing(self):
+        # the test database stands in for the replica; the router's choices are recorded
+        chosen = []
+        db_for_read = PrimaryReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            chosen.append(db_for_read(router, model, **hints))
+            return chosen[-1]
+
+        with override_settings(DATABASE_REPLICAS=['default']), \
+                mock.patch.object(PrimaryReplicaRouter, 'db_for_read', record):
+            yield chosen
+
+    def reads(self, client, path):
+        with self.routing() as chosen:
+            self.assertEqual(client.get(path).status_code, 200)
+        return set(chosen)
+
+    def test_recently_changed_orders_are_read_from_the_primary(self):
+        self.fill_cart(1)
+        client = make_client(self.customer)
+        self.assertEqual(client.post('/api/orders').status_code, 201)
+
+        self.assertEqual(self.reads(client, '/api/orders'), {None})
+        with override_settings(REPLICA_MAX_LAG=0):
+            self.assertEqual(self.reads(client, '/api/orders'), {'default'})
+
+    def test_batched_reads_after_a_write_use_the_primary(self):
+        menuitem = MenuItem.objects.create(title='Dish', price=Decimal('2.50'), featured=False,
+                                           category=self.category)
+        requests = [{'method': 'POST', 'path': '/api/cart/menu-items/bulk',
+                     'body': {'items': [{'menuitem': menuitem.pk, 'quantity': 2}]}},
+                    {'method': 'GET', 'path': '/api/cart/menu-items'},
+                    {'method': 'GET', 'path': '/api/orders'}]
+
+        # without REPLICA_MAX_LAG only the batch's own write keeps the reads on the primary
+        with override_settings(REPLICA_MAX_LAG=0), self.routing() as chosen:
+            # a new client, so its middleware is loaded with the replicas configured
+            response = make_client(self.customer).post('/api/batch', {'requests': requests}, format='json')
+
+        self.assertEqual([result['status'] for result in response.data['responses']], [200, 200, 200])
+        self.assertEqual(set(chosen), {None})
+
+    def test_sync_replica_copies_the_primary(self):
+        self.fill_cart(2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            call_command('sync_replica', path, stdout=StringIO())
+            with sqlite3.connect(path) as replica:
+                self.assertEqual(replica.execute('SELECT count(*) FROM LittleLemonApi_cart').fetchone(), (2,))
+
+
+class MenuSearchTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = make_client(self.customer)
+        poultry = Category.objects.create(slug='chicken', title='Chicken dishes')
+        self.souvlaki = MenuItem.objects.create(title='Chicken Souvlaki', price=Decimal('9.00'), featured=False,
+                                                category=self.category)
+        self.salad = MenuItem.objects.create(title='Greek Salad', price=Decimal('6.00'), featured=False,
+                                             category=self.category)
+        self.wings = MenuItem.objects.create(title='Wings', price=Decimal('7.00'), featured=False, category=poultry)
+        self.chickpeas = MenuItem.objects.create(title='Chickpea Stew', price=Decimal('5.00'), featured=False,
+                                                 category=self.category)
+
+    def search(self, query):
+        response = self.client.get(f'/api/menu-items?perpage=10&{query}')
+        self.assertEqual(response.status_code, 200)
+        return [item['title'] for item in response.data]
+
+    def test_prefix_matches_are_ranked_title_first(self):
+        self.assertEqual(self.search('search=chick')[-1], 'Wings')
+        self.assertEqual(set(self.search('search=chick')), {'Chicken Souvlaki', 'Chickpea Stew', 'Wings'})
+        self.assertEqual(self.search('search=SOUV+chick'), ['Chicken Souvlaki'])
+        self.assertEqual(self.search('search=chick&ordering=price'), ['Chickpea Stew', 'Wings', 'Chicken Souvlaki'])
+        self.assertEqual(self.search('search=%22%29'), [])
+
+    def test_index_follows_menu_and_category_changes(self):
+        self.salad.title = 'Chicken Salad'
+        self.salad.save()
+        self.wings.delete()
+        Category.objects.filter(pk=self.category.pk).update(title='Chicken mains')
+
+        self.assertEqual(self.search('search=salad+chick'), ['Chicken Salad'])
+        self.assertEqual(len(self.search('search=chick')), 3)
+        self.assertEqual(self.search('search=wings'), [])
+
+    def test_search_with_filters_and_cursor_pagination(self):
+        titles, path = [], '/api/menu-items?search=chick&to_price=8&pagination=cursor&perpage=1&with_count=1'
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.data['count'], 2)
+            titles += [item['title'] for item in response.data['results']]
+            path = response.data['next']
+
+        self.assertEqual(titles, self.search('search=chick&to_price=8'))
+        self.assertEqual(set(titles), {'Chickpea Stew', 'Wings'})
+
+
+class SalesRollupTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = User.objects.create_user('manager', password='secret')
+        self.manager.groups.add(Group.objects.get(name='Manager'))
+        self.client = make_client(self.customer)
+
+    def rollups(self):
+        return (list(DailySales.objects.values_list('date', 'orders', 'items', 'revenue')),
+                list(MenuItemSales.objects.order_by('pk').values_list('menuitem_id', 'quantity', 'revenue')),
+                list(CategorySales.objects.values_list('category_id', 'quantity', 'revenue')))
+
+    def test_checkouts_update_the_rollups_and_analytics(self):
+        self.fill_cart(2)
+        self.client.post('/api/orders')
+        Cart.objects.create(user=self.customer, menuitem=MenuItem.objects.first(), quantity=1,
+                            unit_price=Decimal('2.50'), price=Decimal('2.50'))
+        self.client.post('/api/orders')
+
+        manager = make_client(self.manager)
+        revenue = manager.get('/api/analytics/revenue')
+        top = manager.get('/api/analytics/menu-items?perpage=1')
+        categories = manager.get('/api/analytics/categories')
+
+        self.assertEqual((revenue.data['orders'], revenue.data['items'], revenue.data['revenue']), (2, 5, '12.50'))
+        self.assertEqual(revenue.data['days'], [{'date': date.today().isoformat(), 'orders': 2, 'items': 5,
+                                                 'revenue': '12.50'}])
+        self.assertEqual(top.data, [{'menuitem': MenuItem.objects.first().pk, 'title': 'Dish 0', 'quantity': 3,
+                                     'revenue': '7.50'}])
+        self.assertEqual(categories.data, [{'category': self.category.pk, 'title': 'Mains', 'quantity': 5,
+                                            'revenue': '12.50'}])
+        self.assertEqual(self.client.get('/api/analytics/revenue').status_code, 403)
+
+    def test_deleted_orders_are_subtracted_and_rebuild_matches(self):
+        for items in (3, 1, 2):
+            self.fill_cart(items)
+            self.client.post('/api/orders')
+        order = Order.objects.order_by('pk').first()
+        self.assertEqual(make_client(self.manager).delete(f'/api/orders/{order.pk}').status_code, 200)
+        incremental = self.rollups()
+
+        call_command('rebuild_sales_rollups', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(self.rollups(), incremental)
+        self.assertEqual(incremental[0], [(date.today(), 2, 6, Decimal('15.00'))])
+
+
+class ConcurrentOrderDeleteTests(CheckoutMixin, TransactionTestCase):
+    @throttle_rates(user=None)
+    def test_parallel_deletes_keep_the_rollups_consistent(self):
+        from .checkout import place_order
+
+        manager = User.objects.create_user('manager', password='secret')
+        manager.groups.add(Group.objects.get(name='Manager'))
+        orders = []
+        for items in (1, 2, 3, 1, 2):
+            self.fill_cart(items)
+            orders.append(place_order(self.customer).pk)
+        # the last order is deleted twice at the same time
+        targets = orders + orders[-1:]
+        clients = [make_client(manager) for _ in targets]
+        barrier = threading.Barrier(len(targets))
+        responses, errors = [], []
+
+        def delete(client, order_id):
+            barrier.wait()
+            try:
+                # 409 asks the client to retry
+                for _ in range(50):
+                    response = client.delete(f'/api/orders/{order_id}')
+                    if response.status_code != 409:
+                        break
+                    time.sleep(0.01)
+                responses.append((order_id, response.status_code))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=delete, args=args) for args in zip(clients, targets)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(responses), sorted([(order_id, 200) for order_id in orders] + [(orders[-1], 404)]))
+        self.assertFalse(Order.objects.exists())
+        incremental = SalesRollupTests.rollups(self)
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(SalesRollupTests.rollups(self), incremental)
+
+
+@override_settings(ORDER_FEED_POLL_INTERVAL=0.01, ORDER_FEED_STREAM_TIMEOUT=0.05)
+class OrderFeedTests(CheckoutMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = User.objects.create_user('manager', password='secret')
+        self.manager.groups.add(Group.objects.get(name='Manager'))
+        self.crew = User.objects.create_user('crew', password='secret')
+        self.crew.groups.add(Group.objects.get(name='Delivery crew'))
+        self.other = User.objects.create_user('other', password='secret')
+        self.order = Order.objects.create(user=self.customer, total=Decimal('5.00'), date=date.today())
+        self.client = make_client(self.customer)
+
+    def update_order(self):
+        make_client(self.manager).patch(f'/api/orders/{self.order.pk}', {'delivery_crew': self.crew.pk})
+        make_client(self.crew).patch(f'/api/orders/{self.order.pk}', {'status': 1})
+
+    def events(self, user, cursor=0):
+        return make_client(user).get(f'/api/orders/events?cursor={cursor}').json()
+
+    def test_updates_are_logged_and_fed_after_the_cursor(self):
+        self.assertEqual(self.client.get('/api/orders/events').json(), {'events': [], 'cursor': 0})
+        self.update_order()
+
+        feed = self.events(self.customer)
+        first, last = OrderEvent.objects.order_by('pk')
+        self.assertEqual([(event['kind'], event['status'], event['delivery_crew']) for event in feed['events']],
+                         [('delivery_crew', False, self.crew.pk), ('status', True, self.crew.pk)])
+        self.assertEqual(feed['cursor'], last.pk)
+        self.assertEqual(self.events(self.crew), feed)
+        self.assertEqual(self.events(self.manager, first.pk)['events'], feed['events'][1:])
+        self.assertEqual(self.events(self.other), {'events': [], 'cursor': 0})
+        self.assertEqual(self.events(self.customer, last.pk), {'events': [], 'cursor': last.pk})
+        self.assertEqual(self.client.get('/api/orders/events?cursor=latest').status_code, 400)
+
+    def test_long_poll_waits_for_events(self):
+        start = time.monotonic()
+        response = self.client.get('/api/orders/events?cursor=0&wait=0.1')
+
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), {'events': [], 'cursor': 0})
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+    def test_event_stream_resumes_from_last_event_id(self):
+        self.update_order()
+        first, last = OrderEvent.objects.order_by('pk')
+
+        response = self.client.get('/api/orders/events', HTTP_ACCEPT='text/event-stream',
+                                   HTTP_LAST_EVENT_ID=str(first.pk), HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count('event: order'), 1)
+        self.assertIn(f'id: {last.pk}\nevent: order\ndata: {{"id":{last.pk},', body)
+
+    async def test_event_stream_under_asgi(self):
+        await sync_to_async(self.update_order)()
+        token = await sync_to_async(lambda: Token.objects.get(user=self.customer).key)()
+
+        response = await self.async_client.get('/api/orders/events', headers={
+            'Authorization': f'Token {token}', 'Accept': 'text/event-stream', 'Last-Event-ID': '0'})
+
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(body.count('event: order'), 2)
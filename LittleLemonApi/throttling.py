@@ -0,0 +1,112 @@
+import math
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, UserRateThrottle
+
+from . import metrics
+from .sharedstore import SharedStore
+
+store = SharedStore('''
+    CREATE TABLE IF NOT EXISTS throttle (
+        key TEXT NOT NULL,
+        window INTEGER NOT NULL,
+        hits INTEGER NOT NULL,
+        PRIMARY KEY (key, window)
+    ) WITHOUT ROWID;
+''')
+
+
+def hit(key, limit, duration, now):
+    """
+    Sliding window counter: the count of the current fixed window plus the
+    previous window's count weighted by how much of it still overlaps the
+    sliding window. Only two rows per key are ever read or written, and the
+    transaction makes check-and-increment atomic across processes.
+
+    Returns ``(allowed, seconds to wait)``.
+    """
+    window = int(now // duration)
+    overlap = 1 - (now % duration) / duration
+    conn = store.connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = dict(conn.execute('SELECT window, hits FROM throttle WHERE key = ? AND window >= ?',
+                                 (key, window - 1)))
+        previous, current = rows.get(window - 1, 0), rows.get(window, 0)
+        if previous * overlap + current >= limit:
+            conn.execute('COMMIT')
+            window_end = (window + 1) * duration - now
+            if current >= limit:
+                return False, window_end
+            # wait until enough of the previous window has slid out
+            excess = previous * overlap + current - (limit - 1)
+            return False, min(excess / previous * duration, window_end)
+        conn.execute('INSERT INTO throttle (key, window, hits) VALUES (?, ?, 1) '
+                     'ON CONFLICT (key, window) DO UPDATE SET hits = hits + 1', (key, window))
+        conn.execute('DELETE FROM throttle WHERE key = ? AND window < ?', (key, window - 1))
+        conn.execute('COMMIT')
+        return True, None
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def reset():
+    store.reset('throttle')
+
+
+class SharedRateThrottleMixin:
+    """
+    Keeps throttle counters in the shared store instead of the per-process
+    cache, so a rate holds across all worker processes. Rates are looked up
+    when the throttle is built, so settings overrides apply.
+    """
+
+    @property
+    def THROTTLE_RATES(self):
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        allowed, self.retry_after = hit(self.key, self.num_requests, self.duration, self.now)
+        if not allowed:
+            metrics.inc('throttled_total', scope=self.scope)
+        return allowed
+
+    def wait(self):
+        return math.ceil(self.retry_after) if self.retry_after is not None else None
+
+
+class SharedAnonRateThrottle(SharedRateThrottleMixin, AnonRateThrottle):
+    pass
+
+
+class SharedUserRateThrottle(SharedRateThrottleMixin, UserRateThrottle):
+    pass
+
+
+class SharedScopedRateThrottle(SharedRateThrottleMixin, ScopedRateThrottle):
+    """
+    Scoped throttle whose ``throttle_scope`` may also map viewset actions (or
+    lower-case HTTP methods) to scopes, e.g. ``{'list': 'user', 'create':
+    'checkout'}``, so one view can draw on several budgets.
+    """
+
+    def allow_request(self, request, view):
+        scope = getattr(view, self.scope_attr, None)
+        if isinstance(scope, dict):
+            scope = scope.get(getattr(view, 'action', None) or request.method.lower())
+        if not scope:
+            return True
+
+        self.scope = scope
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -16,6 +16,7 @@ router.register(r'orders', views.OrderItemViewSet)
 urlpatterns = [
     path('menu-items', views.MenuItemView.as_view()),
     path('menu-items/<int:pk>', views.SingleMenuItemView.as_view()),
+    path('menu-items/cache-stats', views.CatalogCacheStatsView.as_view()),
     path('api-token-auth/', obtain_auth_token),
     path('groups/manager/users/<str:userId>', views.ManagersDestroyView.as_view()),
     path('groups/delivery-crew/users/<str:userId>', views.DeliveryDestroyView.as_view()),
@@ -24,6 +25,13 @@ urlpatterns = [
         'post': 'create',
         'delete': 'destroy'
     })),
+    path('cart/menu-items/bulk', views.CartViewSet.as_view({'post': 'bulk'})),
+    path('batch', views.BatchView.as_view(), name='batch'),
+    path('orders/export', views.OrderExportView.as_view()),
+    path('orders/events', views.OrderEventsView.as_view(), name='order-events'),
+    path('analytics/revenue', views.RevenueView.as_view()),
+    path('analytics/menu-items', views.TopMenuItemsView.as_view()),
+    path('analytics/categories', views.CategorySalesView.as_view()),
     path('orders/<str:orderId>', views.OrderViewSet.as_view({
         'get': 'list',
         'put': 'update',
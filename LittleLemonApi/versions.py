@@ -0,0 +1,77 @@
+import time
+
+from django.core.cache import caches
+
+from .sharedstore import SharedStore
+
+# cache alias every worker process on the host can see (see CACHES in settings)
+SHARED_CACHE = 'shared'
+
+# Version markers live in the shared store rather than the shared cache: they
+# never expire, a write is a single UPSERT however many there are, and the
+# cache's culling cannot evict them (which would invalidate every credential
+# and role cached on the host at once).
+store = SharedStore('''
+    CREATE TABLE IF NOT EXISTS version (
+        scope TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID;
+''')
+
+
+def shared_cache():
+    return caches[SHARED_CACHE]
+
+
+def _now():
+    # microseconds since the epoch, so a version also tells when it last changed
+    return time.time_ns() // 1000
+
+
+def get_version(scope):
+    """
+    Returns the current version marker of ``scope``, creating it on first
+    use. Of concurrent first uses the first insert wins.
+    """
+    conn = store.connection()
+    row = conn.execute('SELECT version FROM version WHERE scope = ?', (scope,)).fetchone()
+    if row is None:
+        row = conn.execute('INSERT INTO version (scope, version) VALUES (?, ?) '
+                           'ON CONFLICT (scope) DO UPDATE SET version = version RETURNING version',
+                           (scope, _now())).fetchone()
+    return row[0]
+
+
+def changed_within(version, seconds):
+    return _now() - version < seconds * 1_000_000
+
+
+def bump_version(scope):
+    # never the same version twice, even within a microsecond or if the clock steps back
+    return store.connection().execute(
+        'INSERT INTO version (scope, version) VALUES (?, ?) '
+        'ON CONFLICT (scope) DO UPDATE SET version = max(excluded.version, version + 1) RETURNING version',
+        (scope, _now())).fetchone()[0]
+
+
+def reset():
+    store.reset('version')
+
+
+def auth_scope(user_id):
+    # changes whenever a user's tokens, account or groups change
+    return f'auth:{user_id}'
+
+
+def cart_scope(user_id):
+    return f'cart:{user_id}'
+
+
+def orders_scope(user_id=None):
+    # 'orders' changes with any order; 'orders:<id>' only with that customer's orders
+    return 'orders' if user_id is None else f'orders:{user_id}'
+
+
+def bump_orders(user_id):
+    bump_version(orders_scope())
+    bump_version(orders_scope(user_id))
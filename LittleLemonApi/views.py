@@ -1,41 +1,119 @@
-from django.db import transaction
-from django.db.models import Sum
+from django.db import IntegrityError, OperationalError, transaction
 from rest_framework import generics, viewsets, status
 from rest_framework.views import APIView
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+from rest_framework.settings import api_settings
 from rest_framework.response import Response
 from rest_framework.decorators import permission_classes, api_view, action, throttle_classes
-from django.contrib.auth.models import User, Group
+from django.contrib.auth.models import User
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
-from .serializers import MenuItemSerializer, UserSerializer, CartSerializer, OrderItemSerializer, OrderSerializer
-from .models import MenuItem, Cart, OrderItem, Order
+from .serializers import MenuItemSerializer, UserSerializer, CartSerializer, OrderItemSerializer, OrderSerializer, \
+    BatchSerializer, CartBulkSerializer, CategorySalesSerializer, DailySalesSerializer, MenuItemSalesSerializer, \
+    fast_cart, fast_menu_items, fast_order_details, fast_orders
+from .models import MenuItem, Cart, OrderItem, Order, OrderEvent, DailySales, MenuItemSales, CategorySales
 from .permissions import AllowManagerCrudReadAll, AllowManagerOnly, AllowCustomerOnly, AllowDeliveryCrewOnly
-from datetime import date
+from .roles import MANAGER, DELIVERY_CREW, get_group, is_customer
+from .batch import run_batch
+from .db import is_lock_contention
+from .cart import PriceTooLarge, UnknownMenuItems, clear_cart, update_cart
+from .checkout import CheckoutConflict, EmptyCart, TotalTooLarge, place_order
+from . import catalog, feed, sales
+from .feed import OrderFeed
+from .versions import bump_orders, bump_version, cart_scope, get_version, orders_scope
+from .conditional import conditional_get
+from .fastserializers import select_fields
+from .filters import TRUE_VALUES, filter_orders, parse_date_param
+from .search import SEARCH_PARAM, search_menu_items
+from .idempotency import idempotent
+from .export import FORMATS, export_orders
+from .renderers import EventStreamRenderer
+from .throttling import SharedScopedRateThrottle, SharedUserRateThrottle
+from .pagination import CURSOR_PARAM, get_page_size, order_by_args, page_link, paginate_keyset, parse_ordering
+import os
+from datetime import date, timedelta
+from django.conf import settings
+from django.db.models import F, Sum
 from django.core.paginator import Paginator, EmptyPage
+from django.http import Http404, StreamingHttpResponse
 
+MENU_ITEM_ORDERING_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'price': 'price',
+    'featured': 'featured',
+    'category': 'category_id',
+}
 
-@throttle_classes([UserRateThrottle])
+ORDER_ORDERING_FIELDS = {
+    'id': 'id',
+    'date': 'date',
+    'total': 'total',
+    'status': 'status',
+    'user': 'user_id',
+}
+ORDER_PAGE_SIZE = 20
+
+
+def orders_list_scope(request, **kwargs):
+    # customers only see their own orders; managers and delivery crew list across customers
+    return orders_scope(request.user.id) if is_customer(request) else orders_scope()
+
+
+@throttle_classes([SharedScopedRateThrottle])
 @permission_classes([AllowManagerCrudReadAll | IsAdminUser])
 class MenuItemView(generics.ListCreateAPIView):
     serializer_class = MenuItemSerializer
+    throttle_scope = 'menu'
 
+    @conditional_get(catalog.CATALOG)
     def list(self, request):
-        queryset = MenuItem.objects.select_related('category').all()
+        # the payload only depends on the query string (and on the host, through the next/previous links)
+        key = ('menu-items', request.get_host(), sorted(request.query_params.lists()))
+        data = catalog.cached(key, lambda: self.build_list(request))
+        return Response(data, status=status.HTTP_200_OK)
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
-        # ordering:
-        ordering = request.query_params.get('ordering')
-        ordering_fields = ordering.split(',')
-        queryset = queryset.order_by(*ordering_fields)
+    def build_list(self, request):
+        queryset = MenuItem.objects.all()
+        # sparse fieldset and expansions; only the columns they need are selected
+        fast = select_fields(fast_menu_items, request.query_params)
 
         # searching:
         category = request.query_params.get('category')
         to_price = request.query_params.get('to_price')
+        search = request.query_params.get(SEARCH_PARAM)
         if category:
             queryset = queryset.filter(category__title=category)
         if to_price:
             queryset = queryset.filter(price__lte=to_price)
+        if search is not None:
+            queryset = search_menu_items(queryset, search)
+
+        # ordering: search results are ranked by relevance unless ordered otherwise
+        if search is not None:
+            ordering = parse_ordering(request.query_params.get('ordering'),
+                                      {**MENU_ITEM_ORDERING_FIELDS, 'relevance': 'search_rank'}, default='relevance')
+        else:
+            ordering = parse_ordering(request.query_params.get('ordering'), MENU_ITEM_ORDERING_FIELDS)
+
+        # cursor pagination:
+        if request.query_params.get('pagination') == 'cursor' or CURSOR_PARAM in request.query_params:
+            page_size = get_page_size(request, default=2)
+            rows = fast.values(queryset, extra=[attname for attname, _ in ordering])
+            page = paginate_keyset(rows, ordering, request.query_params.get(CURSOR_PARAM), page_size)
+            data = {
+                'next': page_link(request, page.next_cursor),
+                'previous': page_link(request, page.previous_cursor),
+                'results': fast.convert(page.results),
+            }
+            if request.query_params.get('with_count') in TRUE_VALUES:
+                data = {'count': self.get_count(queryset, category, to_price, search), **data}
+            return data
 
         # pagination
+        queryset = fast.values(queryset.order_by(*order_by_args(ordering)))
         per_page = request.query_params.get('perpage', default=2)
         page = request.query_params.get('page', default=1)
         paginator = Paginator(queryset, per_page=per_page)
@@ -44,18 +122,45 @@ class MenuItemView(generics.ListCreateAPIView):
         except EmptyPage:
             queryset = []
 
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return fast.convert(queryset)
 
+    def get_count(self, queryset, category, to_price, search):
+        # the total only depends on the filters, so it is shared by every page and ordering
+        return catalog.cached(('menu-items:count', category, to_price, search), queryset.count,
+                              timeout=settings.MENU_ITEM_COUNT_CACHE_TIMEOUT)
 
-@throttle_classes([UserRateThrottle])
+
+@throttle_classes([SharedScopedRateThrottle])
 @permission_classes([AllowManagerCrudReadAll | IsAdminUser])
 class SingleMenuItemView(generics.RetrieveUpdateAPIView, generics.DestroyAPIView):
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
+    throttle_scope = 'menu'
+
+    @conditional_get(catalog.CATALOG)
+    def retrieve(self, request, *args, **kwargs):
+        fast = select_fields(fast_menu_items, request.query_params)
+        key = ('menu-item', kwargs['pk'], fast.fields, fast.expand)
+        data = catalog.cached(key, lambda: self.build_item(fast, kwargs['pk']))
+        return Response(data, status=status.HTTP_200_OK)
+
+    def build_item(self, fast, pk):
+        items = fast.list(MenuItem.objects.filter(pk=pk))
+        if not items:
+            raise Http404
+        return items[0]
 
 
-@throttle_classes([UserRateThrottle])
+@throttle_classes([SharedUserRateThrottle])
+@permission_classes([AllowManagerOnly | IsAdminUser])
+class CatalogCacheStatsView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        return Response({**catalog.get_stats(), 'pid': os.getpid(), 'version': get_version(catalog.CATALOG)},
+                        status=status.HTTP_200_OK)
+
+
+@throttle_classes([SharedUserRateThrottle])
 @permission_classes([AllowManagerOnly | IsAdminUser])
 class ManagersViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -63,7 +168,7 @@ class ManagersViewSet(viewsets.ModelViewSet):
     http_method_names = ['get', 'post']
 
     def list(self, request, *args, **kwargs):
-        manager_group = Group.objects.get(name='Manager')
+        manager_group = get_group(MANAGER)
         manager_users = User.objects.filter(groups=manager_group)
 
         serializer = self.serializer_class(manager_users, many=True)
@@ -71,7 +176,7 @@ class ManagersViewSet(viewsets.ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         username = self.request.data['username']
-        manager_group = Group.objects.get(name='Manager')
+        manager_group = get_group(MANAGER)
 
         try:
             user = User.objects.get(username=username)
@@ -81,13 +186,13 @@ class ManagersViewSet(viewsets.ModelViewSet):
             return Response({'message': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-@throttle_classes([UserRateThrottle])
+@throttle_classes([SharedUserRateThrottle])
 @permission_classes([AllowManagerOnly | IsAdminUser])
 class ManagersDestroyView(APIView):
 
     def delete(self, request, *args, **kwargs):
         username = kwargs['userId']
-        manager_group = Group.objects.get(name='Manager')
+        manager_group = get_group(MANAGER)
 
         try:
             user = User.objects.get(username=username)
@@ -97,7 +202,7 @@ class ManagersDestroyView(APIView):
             return Response({'message': 'Not found'}, status.HTTP_404_NOT_FOUND)
 
 
-@throttle_classes([UserRateThrottle])
+@throttle_classes([SharedUserRateThrottle])
 @permission_classes([AllowManagerOnly | IsAdminUser])
 class DeliveryViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -105,7 +210,7 @@ class DeliveryViewSet(viewsets.ModelViewSet):
     http_method_names = ['get', 'post']
 
     def list(self, request, *args, **kwargs):
-        manager_group = Group.objects.get(name='Delivery crew')
+        manager_group = get_group(DELIVERY_CREW)
         manager_users = User.objects.filter(groups=manager_group)
 
         serializer = self.serializer_class(manager_users, many=True)
@@ -113,7 +218,7 @@ class DeliveryViewSet(viewsets.ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         username = self.request.data['username']
-        delivery_crew_group = Group.objects.get(name='Delivery crew')
+        delivery_crew_group = get_group(DELIVERY_CREW)
 
         try:
             user = User.objects.get(username=username)
@@ -123,13 +228,13 @@ class DeliveryViewSet(viewsets.ModelViewSet):
             return Response({'message': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-@throttle_classes([UserRateThrottle])
+@throttle_classes([SharedUserRateThrottle])
 @permission_classes([AllowManagerOnly | IsAdminUser])
 class DeliveryDestroyView(APIView):
 
     def delete(self, request, *args, **kwargs):
         username = kwargs['userId']
-        delivery_crew_group = Group.objects.get(name='Delivery crew')
+        delivery_crew_group = get_group(DELIVERY_CREW)
 
         try:
             user = User.objects.get(username=username)
@@ -139,39 +244,57 @@ class DeliveryDestroyView(APIView):
             return Response({'message': 'Not found'}, status.HTTP_404_NOT_FOUND)
 
 
-@throttle_classes([UserRateThrottle])
+@throttle_classes([SharedUserRateThrottle])
 @permission_classes([AllowCustomerOnly])
 class CartViewSet(viewsets.ViewSet):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
 
+    @conditional_get(lambda request, **kwargs: cart_scope(request.user.id))
     def list(self, request):
         queryset = Cart.objects.filter(user=request.user)
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(fast_cart.list(queryset), status=status.HTTP_200_OK)
 
+    @idempotent
     def create(self, request):
         cart_data = request.data.copy()
         cart_data['user'] = request.user.id
         serializer = self.serializer_class(data=cart_data)
         if serializer.is_valid():
             serializer.save()
+            bump_version(cart_scope(request.user.id))
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @idempotent
+    def bulk(self, request):
+        serializer = CartBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        quantities = {item['menuitem']: item['quantity'] for item in serializer.validated_data['items']}
+        try:
+            update_cart(request.user, quantities)
+        except PriceTooLarge as e:
+            return Response({'items': [f'Quantity too large for menu items: {e.ids}.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        except UnknownMenuItems as e:
+            return Response({'items': [f'Unknown menu items: {e.ids}.']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(fast_cart.list(Cart.objects.filter(user=request.user)), status=status.HTTP_200_OK)
+
     def destroy(self, request, pk=None):
-        queryset = Cart.objects.filter(user=request.user)
-        for obj in queryset:
-            obj.delete()
+        clear_cart(request.user)
         return Response({'message': 'Ok'}, status=status.HTTP_200_OK)
 
 
-@throttle_classes([UserRateThrottle])
+@throttle_classes([SharedScopedRateThrottle])
 class OrderItemViewSet(viewsets.ViewSet):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
+    # checkout gets its own budget; browsing orders shares the per-user one
+    throttle_scope = {'list': 'user', 'create': 'checkout'}
 
+    @conditional_get(orders_list_scope)
     def list(self, request):
         # Create instances of the permission classes
         customer_permission = AllowCustomerOnly()
@@ -180,82 +303,144 @@ class OrderItemViewSet(viewsets.ViewSet):
 
         # customers list operation:
         if customer_permission.has_permission(request, self):
-            queryset = self.queryset.filter(order=request.user)
-            serializer = self.serializer_class(queryset, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            queryset = Order.objects.filter(user=request.user)
+            fast = select_fields(fast_order_details, request.query_params)
+            return Response(fast.list(queryset), status=status.HTTP_200_OK)
 
         # managers list operation:
         if manager_permission.has_permission(request, self):
-            queryset = Order.objects.all()
-            serializer = OrderSerializer(queryset, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            queryset = filter_orders(Order.objects.all(), request.query_params)
+            return self.paginated_orders(request, queryset)
 
         # delivery crew operation:
         if delivery_crew_permission.has_permission(request, self):
-            queryset = Order.objects.filter(delivery_crew=request.user)
-            serializer = OrderSerializer(queryset, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            queryset = filter_orders(Order.objects.filter(delivery_crew=request.user), request.query_params)
+            return self.paginated_orders(request, queryset)
 
         else:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
 
+    def paginated_orders(self, request, queryset):
+        ordering = parse_ordering(request.query_params.get('ordering'), ORDER_ORDERING_FIELDS, default='-date')
+        page_size = get_page_size(request, default=ORDER_PAGE_SIZE)
+        fast = select_fields(fast_orders, request.query_params)
+        rows = fast.values(queryset, extra=[attname for attname, _ in ordering])
+        page = paginate_keyset(rows, ordering, request.query_params.get(CURSOR_PARAM), page_size)
+        return Response({
+            'next': page_link(request, page.next_cursor),
+            'previous': page_link(request, page.previous_cursor),
+            'results': fast.convert(page.results),
+        }, status=status.HTTP_200_OK)
+
+    @idempotent
     def create(self, request):
         customer_permission = AllowCustomerOnly()
         if customer_permission.has_permission(request, self):
-            carts = Cart.objects.filter(user=request.user)
-            if len(carts) > 0:
-                # CREATES ORDER OBJECT:
-                total = carts.aggregate(total=Sum('price')).get('total')
-                Order.objects.create(user=request.user, total=total, date=date.today())
-                # CREATES ORDER ITEMS:
-                # Loop through the filtered Cart objects and create corresponding OrderItem objects
-                with transaction.atomic():
-                    for cart_item in carts:
-                        # You can access the related user and menu item from the Cart object
-                        user = cart_item.user
-                        menu_item = cart_item.menuitem
-                        quantity = cart_item.quantity
-                        unit_price = cart_item.unit_price
-                        price = cart_item.price
-                        try:
-                            # Create the OrderItem object using the retrieved values
-                            OrderItem.objects.create(
-                                order=user,
-                                menuitem=menu_item,
-                                quantity=quantity,
-                                unit_price=unit_price,
-                                price=price
-                            )
-                        except Exception as e:
-                            return Response(status=status.HTTP_400_BAD_REQUEST)
-
-                # delete carts:
-                carts.delete()
-                return Response({'message': 'Created'}, status=status.HTTP_201_CREATED)
-            else:
-                return Response(status.HTTP_400_BAD_REQUEST)
+            try:
+                order = place_order(request.user)
+            except (EmptyCart, IntegrityError):
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            except TotalTooLarge:
+                return Response({'message': 'Order total too large'}, status=status.HTTP_400_BAD_REQUEST)
+            except CheckoutConflict:
+                # a concurrent checkout of the same cart won
+                return Response({'message': 'Checkout already in progress'}, status=status.HTTP_409_CONFLICT)
+            except OperationalError as error:
+                # the write lock stayed taken past the busy timeout: the client may retry;
+                # anything else is a server error
+                if not is_lock_contention(error):
+                    raise
+                return Response({'message': 'Database busy, try again'}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                headers={'Retry-After': '1'})
+            return Response({'message': 'Created', 'order': order.id}, status=status.HTTP_201_CREATED)
         else:
-            return Response(status.HTTP_400_BAD_REQUEST)
+            return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-@throttle_classes([UserRateThrottle])
+@throttle_classes([SharedUserRateThrottle])
+@permission_classes([AllowManagerOnly | IsAdminUser])
+class OrderExportView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        # ?output= because ?format= is taken by DRF's content negotiation
+        output_format = request.query_params.get('output', 'ndjson')
+        if output_format not in FORMATS:
+            return Response({'output': f'Must be one of {", ".join(FORMATS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        after_id = request.query_params.get('after_id', '0')
+        if not after_id.isdigit():
+            return Response({'after_id': 'Must be an order id.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = filter_orders(Order.objects.all(), request.query_params)
+        content_type = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_orders(output_format, queryset, after_id=int(after_id)),
+                                         content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="orders.{output_format}"'
+        return response
+
+
+@throttle_classes([SharedScopedRateThrottle])
+@permission_classes([IsAuthenticated])
+class OrderEventsView(APIView):
+    """
+    Order status and delivery crew changes after ?cursor= (or Last-Event-ID),
+    instead of polling /api/orders: waits up to ?wait= seconds for one as a
+    long poll, or streams them as Server-Sent Events to clients accepting
+    text/event-stream. Both wait without holding a thread when served
+    through LittleLemon.asgi.
+    """
+    throttle_scope = 'order_events'
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [EventStreamRenderer]
+
+    def get(self, request, *args, **kwargs):
+        cursor = request.query_params.get('cursor', request.headers.get('Last-Event-ID'))
+        if cursor is not None and not cursor.isdigit():
+            return Response({'cursor': 'Must be an event id.'}, status=status.HTTP_400_BAD_REQUEST)
+        order_feed = OrderFeed(request, None if cursor is None else int(cursor))
+
+        if request.accepted_renderer.format == 'sse':
+            response = StreamingHttpResponse(feed.stream(request, feed.event_stream(order_feed)),
+                                             content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            # nginx would otherwise buffer the stream
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        wait = request.query_params.get('wait', '0')
+        try:
+            wait = min(max(float(wait), 0), settings.ORDER_FEED_MAX_WAIT)
+        except ValueError:
+            return Response({'wait': 'Must be a number of seconds.'}, status=status.HTTP_400_BAD_REQUEST)
+        events = order_feed.read()
+        if events or not wait:
+            return Response({'events': events, 'cursor': order_feed.cursor}, status=status.HTTP_200_OK)
+        response = StreamingHttpResponse(feed.stream(request, feed.long_poll(order_feed, wait)),
+                                         content_type='application/json')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+@throttle_classes([SharedUserRateThrottle])
 class OrderViewSet(viewsets.ViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
 
+    @conditional_get(lambda request, **kwargs: orders_scope(request.user.id))
     def list(self, request, *args, **kwargs):
         # Create instances of the permission classes
         customer_permission = AllowCustomerOnly()
         # customers list operation:
         if customer_permission.has_permission(request, self):
             order_id = kwargs['orderId']
-            order = Order.objects.get(pk=order_id)
-            if order.user != request.user:
+            fast = select_fields(fast_order_details, request.query_params)
+            rows = []
+            if order_id.isdigit():
+                rows = list(fast.values(Order.objects.filter(pk=order_id), extra=['user_id']))
+            if not rows:
+                return Response({'message': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+            if rows[0].user_id != request.user.id:
                 return Response({'message': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
             else:
-                queryset = OrderItem.objects.filter(order=request.user)
-                serializer = OrderItemSerializer(queryset, many=True)
-                return Response(serializer.data, status=status.HTTP_200_OK)
+                return Response(fast.convert(rows)[0], status=status.HTTP_200_OK)
         else:
             return Response(status=status.HTTP_403_FORBIDDEN)
 
@@ -277,7 +462,10 @@ class OrderViewSet(viewsets.ViewSet):
             if delivery_crew is not None:
                 order = Order.objects.get(pk=order_id)
                 order.delivery_crew_id = delivery_crew
-                order.save()
+                with transaction.atomic():
+                    order.save()
+                    feed.record_event(order, OrderEvent.DELIVERY_CREW)
+                bump_orders(order.user_id)
                 return Response(status=status.HTTP_200_OK)
             else:
                 return Response(status=status.HTTP_400_BAD_REQUEST)
@@ -294,7 +482,10 @@ class OrderViewSet(viewsets.ViewSet):
                 order = Order.objects.get(pk=order_id)
                 if order.delivery_crew == request.user:
                     order.status = delivery_status
-                    order.save()
+                    with transaction.atomic():
+                        order.save()
+                        feed.record_event(order, OrderEvent.STATUS)
+                    bump_orders(order.user_id)
                     return Response(status=status.HTTP_200_OK)
                 else:
                     return Response(status=status.HTTP_401_UNAUTHORIZED)
@@ -308,7 +499,75 @@ class OrderViewSet(viewsets.ViewSet):
         manager_permission = AllowManagerOnly()
         if manager_permission.has_permission(request, self):
             order_id = kwargs['orderId']
-            order = Order.objects.get(pk=order_id)
-            order.delete()
+            try:
+                with transaction.atomic():
+                    # write before reading: SQLite takes the write lock here, waiting for other
+                    # writers, instead of failing to upgrade a read lock halfway through; a
+                    # concurrent delete of the same order then finds nothing to claim
+                    if not order_id.isdigit() or not Order.objects.filter(pk=order_id).update(status=F('status')):
+                        return Response({'message': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+                    order = Order.objects.get(pk=order_id)
+                    sales.remove_order(order)
+                    order.delete()
+            except OperationalError as error:
+                if not is_lock_contention(error):
+                    raise
+                return Response({'message': 'Order is being changed, retry'}, status=status.HTTP_409_CONFLICT,
+                                headers={'Retry-After': '1'})
+            bump_orders(order.user_id)
+            return Response({'message': 'Ok'}, status=status.HTTP_200_OK)
         else:
             return Response(status=status.HTTP_403_FORBIDDEN)
+
+
+@throttle_classes([SharedScopedRateThrottle])
+@permission_classes([IsAuthenticated])
+class BatchView(APIView):
+    # each sub-request is throttled and permission-checked by its own view as well
+    throttle_scope = 'batch'
+
+    def post(self, request, *args, **kwargs):
+        serializer = BatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'responses': run_batch(request, serializer.validated_data['requests'])},
+                        status=status.HTTP_200_OK)
+
+
+# Sales analytics, answered from the rollup tables (see sales.py) whatever the size of the order history
+
+@throttle_classes([SharedUserRateThrottle])
+@permission_classes([AllowManagerOnly | IsAdminUser])
+class RevenueView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        # the last 30 days by default
+        date_to = parse_date_param(request.query_params, 'date_to') or date.today()
+        date_from = parse_date_param(request.query_params, 'date_from') or date_to - timedelta(days=29)
+        days = DailySales.objects.filter(date__gte=date_from, date__lte=date_to).order_by('date')
+        totals = days.aggregate(orders=Sum('orders'), items=Sum('items'), revenue=Sum('revenue'))
+        return Response({
+            'days': DailySalesSerializer(days, many=True).data,
+            'orders': totals['orders'] or 0,
+            'items': totals['items'] or 0,
+            'revenue': DailySalesSerializer().fields['revenue'].to_representation(totals['revenue'] or 0),
+        }, status=status.HTTP_200_OK)
+
+
+@throttle_classes([SharedUserRateThrottle])
+@permission_classes([AllowManagerOnly | IsAdminUser])
+class TopMenuItemsView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        limit = get_page_size(request, default=10)
+        top = MenuItemSales.objects.select_related('menuitem').filter(quantity__gt=0).order_by('-quantity')[:limit]
+        return Response(MenuItemSalesSerializer(top, many=True).data, status=status.HTTP_200_OK)
+
+
+@throttle_classes([SharedUserRateThrottle])
+@permission_classes([AllowManagerOnly | IsAdminUser])
+class CategorySalesView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        categories = CategorySales.objects.select_related('category').order_by('-revenue')
+        return Response(CategorySalesSerializer(categories, many=True).data, status=status.HTTP_200_OK)